@@ -1,296 +1,1446 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS # 导入 CORS 模块
 import cv2
 import numpy as np
-from scipy.signal import argrelextrema, savgol_filter
+from scipy.signal import savgol_filter
+import argparse
 import base64
-import matplotlib
-# 使用非交互式 Agg 后端，以避免在非主线程中创建 GUI 窗口的错误
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import hashlib
+import io
+import itertools
+import json
+import logging
+import multiprocessing
 import os
+import queue
+import signal
+import sys
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from center import contains_chinese
+from glyph_pipeline import compose_glyph, denoise_lut, ink_rows
+from glyphs import INK_THRESHOLD, ink_box, update_manifest
+from rename import is_blank_array, target_name
+import segment_metrics
+from segment_metrics import timed
+
 app = Flask(__name__)
-CORS(app) # 初始化 CORS，允许所有来源的跨域请求
+# 初始化 CORS，允许所有来源的跨域请求；/crop 的统计信息和分阶段计时放在响应头中，需允许前端读取
+CORS(app, expose_headers=['X-Crop-Count', 'X-Crop-Blank', 'Server-Timing'])
 
-# 设置 Matplotlib 支持中文
-plt.rcParams['font.sans-serif'] = ['Songti SC']
-plt.rcParams['axes.unicode_minus'] = False
+# 逐请求的跟踪信息使用 DEBUG 级别，默认不输出；启动时加 --verbose 可查看
+logger = logging.getLogger('auto_segment')
 
 # 定义日志文件夹
 LOG_DIR = 'logs'
 
-# 定义一个可以被外部调用的核心分割函数
-def get_vertical_split_positions(img_data, top_y, bottom_y, left_x, right_x, min_char_width=30, max_char_width=80):
+# 调试图模式：
+#   off      - 不绘制，请求中不做任何 matplotlib 工作（默认）
+#   sync     - 在请求中同步绘制并保存
+#   deferred - 交给后台线程绘制，请求先返回
+DEBUG_PLOT_MODE = os.environ.get('SEGMENT_DEBUG_PLOT', 'off')
+# 采样：每 N 次分割绘制一次，1 表示每次都绘制
+DEBUG_PLOT_SAMPLE_EVERY = max(1, int(os.environ.get('SEGMENT_DEBUG_SAMPLE', '1')))
+# 后台队列长度，队列满时丢弃新的调试图，不阻塞请求
+DEBUG_PLOT_QUEUE_SIZE = 64
+# logs/ 目录上限：超出任一上限时从最旧的调试图开始删除
+LOG_MAX_FILES = int(os.environ.get('SEGMENT_LOG_MAX_FILES', '200'))
+LOG_MAX_BYTES = int(os.environ.get('SEGMENT_LOG_MAX_MB', '200')) * 1024 * 1024
+
+# 在响应头 Server-Timing 中返回本次请求各阶段的耗时（毫秒）
+SERVER_TIMING = os.environ.get('SEGMENT_SERVER_TIMING', '0') == '1'
+
+# 已解码页面缓存的内存上限
+PAGE_CACHE_MAX_BYTES = int(os.environ.get('SEGMENT_CACHE_MB', '256')) * 1024 * 1024
+
+# 分割参数的默认值（全能扫描王：(30, 80)），含义见 find_split_positions
+SPLIT_DEFAULTS = {
+    'min_char_width': 30,
+    'max_char_width': 80,
+    'zero_run': 15,
+    'savgol_window': 11,
+    'valley_threshold': 2000,
+}
+# 除最小、最大字符宽度外的分割参数，以 options 字典传递
+SPLIT_OPTION_KEYS = ('zero_run', 'savgol_window', 'valley_threshold')
+# 按扫描仪调好的分割参数（segment_sweep.py --save-profile 写入），请求中用 profile 选择
+PROFILES_PATH = os.environ.get('SEGMENT_PROFILES', 'segment_profiles.json')
+
+# /crop 以 output=library 直接写入的字库文件夹
+LIBRARY_DIR = os.environ.get('SEGMENT_LIBRARY', 'output_chars_ds')
+# 同一时刻只有一个请求写入字库，避免文件名冲突
+_library_lock = threading.Lock()
+
+# 分割计算使用的进程池，None 表示在请求线程内直接计算
+_pool = None
+# 进程池中排队和运行中的任务数上限，超出时返回 429
+_pool_slots = None
+# 已提交到进程池、尚未返回的任务数
+_jobs_in_flight = 0
+_jobs_lock = threading.Lock()
+
+_profiles = {'mtime_ns': None, 'profiles': {}}
+
+_plot_counter = itertools.count()
+_plot_lock = threading.Lock()
+_plot_queue_lock = threading.Lock()
+_plot_queue = None
+_plt = None
+
+def decode_gray_image(img_data):
     """
-    基于投影零点和局部最小值在给定区域内进行字符分割。
+    将图像字节解码为灰度图。
 
     参数:
     img_data (bytes): 图像的原始字节数据。
-    top_y (int): 裁剪区域的顶部Y坐标。
-    bottom_y (int): 裁剪区域的底部Y坐标。
-    left_x (int): 裁剪区域的左侧X坐标。
-    right_x (int): 裁剪区域的右侧X坐标。
+
+    返回:
+    numpy.ndarray | None: 灰度图，无法解码时返回 None。
+    """
+    nparr = np.frombuffer(img_data, np.uint8)
+    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    if img is None:
+        return None
+    # 先按彩色解码再转灰度，与逐行裁剪后再转灰度的结果逐像素一致
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+def binarize(gray):
+    """Otsu 反相二值化：笔迹为 255，背景为 0。"""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return binary
+
+class PageCache:
+    """
+    以图像内容哈希为键的 LRU 缓存，保存解码后的灰度页面和整页二值图。
+
+    同一张扫描件的重复请求直接复用缓存，跳过解码和 Otsu 二值化。
+    超出内存上限时按最近最少使用的顺序淘汰。
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(page):
+        return sum(arr.nbytes for arr in page.values() if arr is not None)
+
+    def _touch(self, key, count=False):
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+            if count:
+                if page is not None:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            return page
+
+    def _store(self, key, page):
+        with self._lock:
+            old = self._pages.pop(key, None)
+            if old is not None:
+                self._bytes -= self._size(old)
+            self._pages[key] = page
+            self._bytes += self._size(page)
+            # 至少保留当前页面，即使它本身超过上限
+            while self._bytes > self.max_bytes and len(self._pages) > 1:
+                _, evicted = self._pages.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def gray(self, img_data):
+        """
+        返回 (缓存键, 灰度页面)；无法解码时灰度页面为 None。
+        """
+        with timed('hash'):
+            key = hashlib.blake2b(img_data, digest_size=16).hexdigest()
+        page = self._touch(key, count=True)
+        if page is not None:
+            return key, page['gray']
+
+        with timed('imdecode'):
+            gray = decode_gray_image(img_data)
+        if gray is not None:
+            self._store(key, {'gray': gray, 'binary': None})
+        return key, gray
+
+    def binary(self, key, gray):
+        """返回整页二值图，首次访问时计算并计入缓存。"""
+        page = self._touch(key)
+        if page is not None and page['binary'] is not None:
+            return page['binary']
+        with timed('otsu'):
+            binary = binarize(gray)
+        self._store(key, {'gray': gray, 'binary': binary})
+        return binary
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._pages),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+page_cache = PageCache(PAGE_CACHE_MAX_BYTES)
+
+def _runs(mask):
+    """
+    找出布尔数组中所有连续 True 区间。
+
+    返回:
+    tuple: (起点数组, 终点后一位数组)
+    """
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return edges[0::2], edges[1::2]
+
+def _closest_to(positions, center):
+    """返回离 center 最近的位置；距离相同时取靠前的一个，与 min(key=...) 一致。"""
+    return positions[np.argmin(np.abs(positions - center))]
+
+def _split_wide_region(char_region, char_start, savgol_window=11, valley_threshold=2000):
+    """
+    在一个过宽的字符区域内选出一个分割点（全局坐标）。
+
+    优先取平滑后投影值不超过 valley_threshold、且离区域中心最近的局部最小值；
+    找不到时回退到离中心最近的全局最小值。
+    """
+    char_width = len(char_region)
+    center = char_start + char_width // 2
+    min_len_for_savgol = 5
+
+    if char_width >= min_len_for_savgol:
+        window_length = min(savgol_window, char_width - (char_width % 2 == 0))
+        if window_length < 3:
+            window_length = 3
+
+        polyorder = min(3, window_length - 1)
+
+        smoothed = savgol_filter(char_region.astype(float), window_length=window_length, polyorder=polyorder)
+        # 严格小于左右相邻点的内部点，等价于 argrelextrema(np.less, order=1)
+        local_min_indices = np.flatnonzero((smoothed[1:-1] < smoothed[:-2]) & (smoothed[1:-1] < smoothed[2:])) + 1
+
+        valid_local_min_indices = local_min_indices[smoothed[local_min_indices] <= valley_threshold]
+        if len(valid_local_min_indices) > 0:
+            return _closest_to(valid_local_min_indices + char_start, center)
+
+    # 回退到原始的全局最小值逻辑
+    min_positions = np.flatnonzero(char_region == char_region.min()) + char_start
+    return _closest_to(min_positions, center)
+
+def find_split_positions(vertical_projection, min_char_width=30, max_char_width=80, zero_run=15, savgol_window=11,
+                         valley_threshold=2000):
+    """
+    基于投影零点和局部最小值计算一行内的分割点。
+
+    参数:
+    vertical_projection (numpy.ndarray): 二值图的垂直投影。
     min_char_width (int): 最小字符宽度(像素)。
     max_char_width (int): 最大字符宽度(像素)。
+    zero_run (int): 长度不小于该值的零点区域取两侧端点作为断点，更短的取中点。
+    savgol_window (int): 过宽区域平滑时 Savitzky–Golay 滤波的最大窗口（奇数）。
+    valley_threshold (int): 过宽区域中平滑后投影值不超过该值的局部最小值才可作为断点。
 
     返回:
-    list: 垂直分割线的横坐标数组。
+    tuple: (原始分割点列表, 过滤后的有效分割点列表)，坐标相对于投影起点。
     """
-    try:
-        # 解码 Base64 字符串为图像
-        nparr = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    with timed('split_search'):
+        split_positions = _split_candidates(np.asarray(vertical_projection), max_char_width, zero_run,
+                                            savgol_window, valley_threshold)
 
-        if img is None:
-            return {'error': '无法解码图像数据'}, 400
-        
-        # 添加日志：打印原始图像的尺寸
-        print(f"原始图像尺寸: {img.shape}")
+    with timed('filter'):
+        # 4. 过滤无效分割点：保留第一个点，之后每次跳到距上一个保留点至少 min_char_width 的位置
+        valid_splits = []
+        i = 0
+        while i < len(split_positions):
+            pos = split_positions[i]
+            # 确保将 np.int64 转换为 Python int，以避免 JSON 序列化错误
+            valid_splits.append(int(pos))
+            i = max(i + 1, int(np.searchsorted(split_positions, pos + min_char_width)))
 
-        # 根据传入的坐标裁剪图像
-        cropped_img = img[top_y:bottom_y, left_x:right_x]
-        
-        # 添加日志：打印裁剪区域的坐标和新图像尺寸
-        print(f"裁剪区域: top_y={top_y}, bottom_y={bottom_y}, left_x={left_x}, right_x={right_x}")
-        print(f"裁剪后的图像尺寸: {cropped_img.shape}")
-        
-        # 检查裁剪后的图像是否为空
-        if cropped_img.shape[0] == 0 or cropped_img.shape[1] == 0:
-            return {'error': '裁剪区域无效，图像为空'}, 400
+    return split_positions.tolist(), valid_splits
 
-        # 转为灰度图并二值化
-        gray = cv2.cvtColor(cropped_img, cv2.COLOR_BGR2GRAY)
-        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
-        
-        # 垂直投影
-        vertical_projection = np.sum(binary, axis=0)
-        
-        # 1. 找到所有连续的绝对零点区域
-        zero_positions = np.where(vertical_projection == 0)[0]
-        zero_runs = []
-        if len(zero_positions) > 0:
-            # 找到连续零点的索引差值不为1的位置
-            diffs = np.diff(zero_positions, prepend=zero_positions[0]-1)
-            split_indices = np.where(diffs > 1)[0]
-            
-            # 从这些索引中提取连续零点区域
-            current_start = 0
-            for split_idx in split_indices:
-                zero_runs.append((zero_positions[current_start], zero_positions[split_idx-1]))
-                current_start = split_idx
-            zero_runs.append((zero_positions[current_start], zero_positions[-1]))
-            
-        split_positions = []
-        for start, end in zero_runs:
-            length = end - start
-            if length < 15:
-                # 区域不长，取中点作为断点
-                split_positions.append(start + length // 2)
-            else:
-                # 区域长，取两侧端点作为断点
-                split_positions.append(start)
-                split_positions.append(end)
-
-        
-        # 2. 处理非零区域 (字符区域)
-        in_char = False
-        char_start = 0
-        
-        for x in range(binary.shape[1]):
-            # 进入字符区域
-            if vertical_projection[x] > 0 and not in_char:
-                in_char = True
-                char_start = x
-            
-            # 离开字符区域
-            elif vertical_projection[x] == 0 and in_char:
-                in_char = False
-                char_width = x - char_start
-                
-                # 检查字符宽度是否超出预期范围
-                if char_width > max_char_width:
-                    char_region = vertical_projection[char_start:x]
-                    
-                    # 策略1: 优先找绝对零点
-                    local_zeros = np.where(char_region == 0)[0] + char_start
-                    if len(local_zeros) > 0:
-                        split_positions.extend(local_zeros)
-                    # 策略2: 没有零点则找局部最小值点
-                    else:
-                        center = char_start + char_width // 2
-                        min_len_for_savgol = 5
-                        
-                        if len(char_region) >= min_len_for_savgol:
-                            window_length = min(11, len(char_region) - (len(char_region)%2==0))
-                            if window_length < 3:
-                                window_length = 3
-                            
-                            polyorder = min(3, window_length - 1)
-
-                            smoothed_char_region = savgol_filter(char_region.astype(float), window_length=window_length, polyorder=polyorder)
-                            local_min_indices = argrelextrema(smoothed_char_region, np.less, order=1)[0]
-                            
-                            local_min_positions = local_min_indices + char_start
-                            
-                            if len(local_min_positions) > 0:
-                                threshold_val = 2000
-                                valid_local_min_positions = [pos for i, pos in enumerate(local_min_positions) if smoothed_char_region[pos - char_start] <= threshold_val]
-                                
-                                if len(valid_local_min_positions) > 0:
-                                    closest = min(valid_local_min_positions, key=lambda pos: abs(pos - center))
-                                    split_positions.append(closest)
-                                else:
-                                    # 回退到原始的全局最小值逻辑
-                                    min_val = np.min(char_region)
-                                    min_positions = np.where(char_region == min_val)[0] + char_start
-                                    if len(min_positions) > 0:
-                                        closest = min(min_positions, key=lambda pos: abs(pos - center))
-                                        split_positions.append(closest)
-                            else:
-                                # 回退到原始的全局最小值逻辑
-                                min_val = np.min(char_region)
-                                min_positions = np.where(char_region == min_val)[0] + char_start
-                                if len(min_positions) > 0:
-                                    closest = min(min_positions, key=lambda pos: abs(pos - center))
-                                    split_positions.append(closest)
-                        else:
-                            min_val = np.min(char_region)
-                            min_positions = np.where(char_region == min_val)[0] + char_start
-                            if len(min_positions) > 0:
-                                closest = min(min_positions, key=lambda pos: abs(pos - center))
-                                split_positions.append(closest)
-        
-        # 3. 排序和去重
-        split_positions = sorted(set(split_positions))
-        
-        # 4. 过滤无效分割点
-        valid_splits = []
-        # 这里的 `min_char_width` 应该是相对于裁剪区域的
-        prev_pos = -min_char_width
-        
-        for pos in split_positions:
-            if pos - prev_pos >= min_char_width:
-                # 加上裁剪区域的左侧X坐标，返回全局坐标
-                # 确保将 np.int64 转换为 Python int，以避免 JSON 序列化错误
-                valid_splits.append(int(pos + left_x))
-                prev_pos = pos
-        
-        # 5. 可视化和日志记录
-        if not os.path.exists(LOG_DIR):
-            os.makedirs(LOG_DIR)
-            
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
-        log_filename = f"segmentation_log_{timestamp}.png"
-        log_filepath = os.path.join(LOG_DIR, log_filename)
-        
+def _split_candidates(vertical_projection, max_char_width, zero_run, savgol_window, valley_threshold):
+    """find_split_positions 的第 1–3 步：零点区域和过宽字符区域给出的候选断点，已排序去重。"""
+    is_zero = vertical_projection == 0
+
+    # 1. 找到所有连续的绝对零点区域
+    zero_starts, zero_stops = _runs(is_zero)
+    zero_ends = zero_stops - 1
+    lengths = zero_ends - zero_starts
+    short = lengths < zero_run
+    candidates = [
+        # 区域不长，取中点作为断点
+        zero_starts[short] + lengths[short] // 2,
+        # 区域长，取两侧端点作为断点
+        zero_starts[~short],
+        zero_ends[~short],
+    ]
+
+    # 2. 处理非零区域 (字符区域)
+    # 只处理以零点结束的区域；延伸到行尾的区域不参与切分
+    char_starts, char_stops = _runs(~is_zero)
+    closed = char_stops < len(vertical_projection)
+    char_starts, char_stops = char_starts[closed], char_stops[closed]
+
+    # 检查字符宽度是否超出预期范围；字符区域内不含零点，直接找局部最小值
+    wide = (char_stops - char_starts) > max_char_width
+    wide_splits = [_split_wide_region(vertical_projection[start:stop], start, savgol_window, valley_threshold)
+                   for start, stop in zip(char_starts[wide], char_stops[wide])]
+    candidates.append(np.array(wide_splits, dtype=np.int64))
+
+    # 3. 排序和去重
+    return np.unique(np.concatenate(candidates))
+
+def _get_pyplot():
+    """首次绘图时才导入 matplotlib，调试图关闭时完全不加载。"""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        # 使用非交互式 Agg 后端，以避免在非主线程中创建 GUI 窗口的错误
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        # 设置 Matplotlib 支持中文
+        plt.rcParams['font.sans-serif'] = ['Songti SC']
+        plt.rcParams['axes.unicode_minus'] = False
+        _plt = plt
+    return _plt
+
+def prune_log_dir(max_files=None, max_bytes=None):
+    """按文件数和总大小限制 LOG_DIR，从最旧的调试图开始删除。"""
+    max_files = LOG_MAX_FILES if max_files is None else max_files
+    max_bytes = LOG_MAX_BYTES if max_bytes is None else max_bytes
+    if not os.path.isdir(LOG_DIR):
+        return
+
+    # 文件名带时间戳，按名称排序即按时间排序
+    names = sorted(f for f in os.listdir(LOG_DIR) if f.startswith('segmentation_log_') and f.endswith('.png'))
+    sizes = [os.path.getsize(os.path.join(LOG_DIR, f)) for f in names]
+    total = sum(sizes)
+    while names and (len(names) > max_files or total > max_bytes):
+        total -= sizes.pop(0)
+        os.remove(os.path.join(LOG_DIR, names.pop(0)))
+
+def save_debug_plot(cropped_gray, binary, vertical_projection, relative_splits):
+    """将裁剪区域、二值图和垂直投影曲线绘制到 LOG_DIR 下的一张 PNG 中。"""
+    plt = _get_pyplot()
+    if not os.path.exists(LOG_DIR):
+        os.makedirs(LOG_DIR, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    log_filename = f"segmentation_log_{timestamp}.png"
+    log_filepath = os.path.join(LOG_DIR, log_filename)
+
+    # pyplot 的当前图状态不是线程安全的，同一时刻只绘制一张
+    with _plot_lock:
         plt.figure(figsize=(10, 15))
-        
+
         # 子图1: 原始图像
         plt.subplot(3, 1, 1)
-        plt.imshow(cv2.cvtColor(cropped_img, cv2.COLOR_BGR2RGB))
+        plt.imshow(cropped_gray, cmap='gray')
         plt.title('原始图像')
-        
+
         # 子图2: 二值化图像
         plt.subplot(3, 1, 2)
         plt.imshow(binary, cmap='gray')
         plt.title('二值化后图像')
-        
+
         # 子图3: 垂直投影曲线和分割点
         plt.subplot(3, 1, 3)
         plt.plot(vertical_projection, label='投影值')
-        
-        # 将分割点坐标转换为相对于裁剪区域的坐标
-        relative_splits = [pos - left_x for pos in valid_splits]
+
         for split_x in relative_splits:
             plt.axvline(x=split_x, color='r', linestyle='--', label='分割点' if split_x == relative_splits[0] else "")
-            
+
         plt.title('垂直投影随 x 轴变化曲线')
         plt.xlabel('x 轴位置')
         plt.ylabel('投影值')
         plt.legend()
         plt.grid(True)
-        
+
         plt.tight_layout()
         plt.savefig(log_filepath)
         # 如果需要本地调试时实时显示图像，可以取消下一行的注释
         # plt.show()
         plt.close()
-        
-        print(f"日志图像已保存到: {log_filepath}")
-        
-        # 添加日志：打印最终找到的分割点
-        print(f"原始分割点: {split_positions}")
-        print(f"找到 {len(valid_splits)} 个有效分割点。")
-        print(f"分割点位置: {valid_splits}")
 
-        return valid_splits
+        prune_log_dir()
+
+    logger.debug(f"日志图像已保存到: {log_filepath}")
+
+def _debug_plot_worker():
+    """后台线程：依次取出队列中的调试数据并绘制。"""
+    while True:
+        args = _plot_queue.get()
+        try:
+            save_debug_plot(*args)
+        except Exception as e:
+            logger.exception(f"绘制调试图时发生异常: {e}")
+        finally:
+            _plot_queue.task_done()
+
+def _ensure_plot_worker():
+    global _plot_queue
+    with _plot_queue_lock:
+        if _plot_queue is None:
+            _plot_queue = queue.Queue(maxsize=DEBUG_PLOT_QUEUE_SIZE)
+            threading.Thread(target=_debug_plot_worker, name='debug-plot', daemon=True).start()
+    return _plot_queue
 
+def record_debug_plot(cropped_gray, binary, vertical_projection, relative_splits):
+    """按 DEBUG_PLOT_MODE 和采样率决定是否绘制调试图，以及同步还是延后绘制。"""
+    if DEBUG_PLOT_MODE == 'off':
+        return
+    if next(_plot_counter) % DEBUG_PLOT_SAMPLE_EVERY != 0:
+        return
+
+    if DEBUG_PLOT_MODE == 'deferred':
+        # 复制行带数据，避免后台线程持有整页图像的引用
+        args = (cropped_gray.copy(), binary.copy(), vertical_projection, list(relative_splits))
+        try:
+            _ensure_plot_worker().put_nowait(args)
+        except queue.Full:
+            logger.warning("调试图队列已满，丢弃本次调试图。")
+    else:
+        save_debug_plot(cropped_gray, binary, vertical_projection, relative_splits)
+
+def split_band(cropped_gray, binary, left_x, min_char_width=30, max_char_width=80, options=None):
+    """
+    对一条已二值化的行带计算分割点并记录日志。
+
+    参数:
+    cropped_gray (numpy.ndarray): 行带的灰度图，仅用于日志可视化。
+    binary (numpy.ndarray): 行带的二值图。
+    left_x (int): 行带左侧在整页中的X坐标。
+    options (dict | None): find_split_positions 的其余参数（SPLIT_OPTION_KEYS）。
+
+    返回:
+    list: 垂直分割线的全局横坐标数组。
+    """
+    # 垂直投影
+    with timed('projection'):
+        vertical_projection = np.sum(binary, axis=0)
+
+    split_positions, relative_splits = find_split_positions(vertical_projection, min_char_width, max_char_width,
+                                                            **(options or {}))
+    # 加上裁剪区域的左侧X坐标，返回全局坐标
+    valid_splits = [pos + left_x for pos in relative_splits]
+
+    # 5. 可视化和日志记录
+    with timed('debug_plot'):
+        record_debug_plot(cropped_gray, binary, vertical_projection, relative_splits)
+
+    # 添加日志：打印最终找到的分割点；未开启 --verbose 时不格式化
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"原始分割点: {split_positions}")
+        logger.debug(f"找到 {len(valid_splits)} 个有效分割点。")
+        logger.debug(f"分割点位置: {valid_splits}")
+
+    return valid_splits
+
+def split_crop(cropped_gray, left_x, min_char_width=30, max_char_width=80, options=None):
+    """对单个裁剪区域二值化并计算分割点，可在进程池中执行。"""
+    # 二值化只作用于裁剪区域，Otsu 阈值与行内像素分布相关
+    with timed('otsu'):
+        binary = binarize(cropped_gray)
+    return split_band(cropped_gray, binary, left_x, min_char_width, max_char_width, options)
+
+def split_bands(binary_bands, gray_bands, left_x, min_char_width=30, max_char_width=80, options=None):
+    """
+    对一页中已二值化的多条行带依次计算分割点，可在进程池中执行。
+
+    gray_bands 仅用于调试图，调试图关闭时可为 None；空行带返回空数组。
+    """
+    results = []
+    for index, binary in enumerate(binary_bands):
+        if binary.size == 0:
+            results.append([])
+            continue
+        cropped_gray = gray_bands[index] if gray_bands is not None else None
+        results.append(split_band(cropped_gray, binary, left_x, min_char_width, max_char_width, options))
+    return results
+
+class ServiceBusy(Exception):
+    """进程池已满，请求应以 429 拒绝。"""
+
+def _init_worker(settings):
+    """进程池初始化：同步主进程的调试图与日志配置（spawn 方式启动时不会继承）。"""
+    globals().update(settings['globals'])
+    logging.basicConfig(level=settings['log_level'], format='%(asctime)s %(processName)s %(levelname)s %(message)s')
+
+def configure_pool(workers, max_pending=None):
+    """
+    创建分割计算进程池。
+
+    参数:
+    workers (int): 进程数；0 表示不使用进程池，在请求线程内计算。
+    max_pending (int | None): 排队和运行中的任务上限，默认为进程数的 4 倍。
+    """
+    global _pool, _pool_slots
+    if _pool is not None:
+        _pool.shutdown()
+        _pool, _pool_slots = None, None
+    if workers <= 0:
+        return
+
+    settings = {
+        'globals': {
+            'DEBUG_PLOT_MODE': DEBUG_PLOT_MODE,
+            'DEBUG_PLOT_SAMPLE_EVERY': DEBUG_PLOT_SAMPLE_EVERY,
+            'LOG_DIR': os.path.abspath(LOG_DIR),
+            'LOG_MAX_FILES': LOG_MAX_FILES,
+            'LOG_MAX_BYTES': LOG_MAX_BYTES,
+        },
+        'log_level': logger.getEffectiveLevel(),
+    }
+    # 计算进程在请求线程中按需创建，fork 会继承其他线程持有的锁，统一使用 spawn
+    _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                initializer=_init_worker, initargs=(settings,))
+    _pool_slots = threading.BoundedSemaphore(max_pending or workers * 4)
+
+def run_job(fn, *args):
+    """
+    执行一次分割计算：配置了进程池时提交到池中并等待结果，否则直接调用。
+
+    进程池已满时立即抛出 ServiceBusy，而不是让请求无限排队。
+    """
+    global _jobs_in_flight
+    if _pool is None:
+        return fn(*args)
+    if not _pool_slots.acquire(blocking=False):
+        raise ServiceBusy()
+    with _jobs_lock:
+        _jobs_in_flight += 1
+    try:
+        start = time.perf_counter()
+        # 计算进程中的分阶段计时随结果带回，合并到本次请求
+        result, timings, elapsed = _pool.submit(segment_metrics.call_with_timings, fn, *args).result()
+        segment_metrics.merge(timings)
+        # 排队等待空闲进程以及参数、结果在进程间传递的时间
+        segment_metrics.record('pool_wait', time.perf_counter() - start - elapsed)
+        return result
+    finally:
+        with _jobs_lock:
+            _jobs_in_flight -= 1
+        _pool_slots.release()
+
+# 定义一个可以被外部调用的核心分割函数
+def get_vertical_split_positions(img_data, top_y, bottom_y, left_x, right_x, min_char_width=30, max_char_width=80,
+                                 options=None):
+    """
+    基于投影零点和局部最小值在给定区域内进行字符分割。
+
+    参数:
+    img_data (bytes): 图像的原始字节数据。
+    top_y (int): 裁剪区域的顶部Y坐标。
+    bottom_y (int): 裁剪区域的底部Y坐标。
+    left_x (int): 裁剪区域的左侧X坐标。
+    right_x (int): 裁剪区域的右侧X坐标。
+    min_char_width (int): 最小字符宽度(像素)。
+    max_char_width (int): 最大字符宽度(像素)。
+    options (dict | None): find_split_positions 的其余参数。
+
+    返回:
+    list: 垂直分割线的横坐标数组。
+    """
+    try:
+        _, gray = page_cache.gray(img_data)
+
+        if gray is None:
+            return {'error': '无法解码图像数据'}, 400
+
+        # 添加日志：打印原始图像的尺寸
+        logger.debug(f"原始图像尺寸: {gray.shape}")
+
+        # 根据传入的坐标裁剪图像
+        with timed('crop'):
+            cropped_gray = gray[top_y:bottom_y, left_x:right_x]
+
+        # 添加日志：打印裁剪区域的坐标和新图像尺寸
+        logger.debug(f"裁剪区域: top_y={top_y}, bottom_y={bottom_y}, left_x={left_x}, right_x={right_x}")
+        logger.debug(f"裁剪后的图像尺寸: {cropped_gray.shape}")
+
+        # 检查裁剪后的图像是否为空
+        if cropped_gray.shape[0] == 0 or cropped_gray.shape[1] == 0:
+            return {'error': '裁剪区域无效，图像为空'}, 400
+
+        return run_job(split_crop, cropped_gray, left_x, min_char_width, max_char_width, options)
+
+    except ServiceBusy:
+        raise
     except Exception as e:
         # 添加日志：打印详细的异常信息
-        print(f"在get_vertical_split_positions函数中发生异常: {e}")
+        logger.exception(f"在get_vertical_split_positions函数中发生异常: {e}")
+        return {'error': str(e)}, 500
+
+def get_page_split_positions(img_data, bands, left_x=0, right_x=None, min_char_width=30, max_char_width=80, skew=0.0,
+                             options=None):
+    """
+    对整页图像一次解码、一次二值化，再按行带切片计算每一行的分割点。
+
+    参数:
+    img_data (bytes): 图像的原始字节数据。
+    bands (list): 行带列表，每项为 (top_y, bottom_y)。
+    left_x (int): 裁剪区域的左侧X坐标。
+    right_x (int | None): 裁剪区域的右侧X坐标，None 表示图像右边缘。
+    min_char_width (int): 最小字符宽度(像素)。
+    max_char_width (int): 最大字符宽度(像素)。
+    skew (float): 页面倾斜角（度），非 0 时 bands 为倾斜校正后的坐标，见 shear_page。
+    options (dict | None): find_split_positions 的其余参数。
+
+    返回:
+    list: 与 bands 一一对应的分割点数组；超出图像的空行带返回空数组。
+    """
+    try:
+        key, gray = page_cache.gray(img_data)
+
+        if gray is None:
+            return {'error': '无法解码图像数据'}, 400
+
+        logger.debug(f"原始图像尺寸: {gray.shape}，行数: {len(bands)}")
+
+        # 整页只二值化一次，各行带直接取二值图的切片（视图，不复制）
+        binary = page_cache.binary(key, gray)
+        if skew:
+            with timed('deskew'):
+                binary = shear_page(binary, skew_slope(skew))
+                if DEBUG_PLOT_MODE != 'off':
+                    gray = shear_page(gray, skew_slope(skew), 255)
+        # 左右边界裁剪到图像范围内；负数若直接切片会从图像右侧开始
+        width = gray.shape[1]
+        left_x = max(0, min(width, int(left_x)))
+        right_x = width if right_x is None else max(left_x, min(width, int(right_x)))
+
+        binary_bands = []
+        gray_bands = []
+        with timed('crop'):
+            for top_y, bottom_y in bands:
+                # 与前端的垂直平移配合时，首末行可能越界，这里裁剪到图像范围内
+                top_y = max(0, top_y)
+                bottom_y = max(top_y, min(gray.shape[0], bottom_y))
+                binary_bands.append(binary[top_y:bottom_y, left_x:right_x])
+                gray_bands.append(gray[top_y:bottom_y, left_x:right_x])
+
+        # 调试图关闭时不把灰度行带传给计算进程
+        if DEBUG_PLOT_MODE == 'off':
+            gray_bands = None
+        return run_job(split_bands, binary_bands, gray_bands, left_x, min_char_width, max_char_width, options)
+
+    except ServiceBusy:
+        raise
+    except Exception as e:
+        logger.exception(f"在get_page_split_positions函数中发生异常: {e}")
+        return {'error': str(e)}, 500
+
+def get_page_grid(img_data, top_y=0, bottom_y=None, left_x=0, right_x=None, min_char_width=30, max_char_width=80,
+                  max_skew=2.0, min_line_height=15, options=None):
+    """
+    对整页图像一次解码、一次二值化，自动找出文字行并分割，返回整页的格子。
+
+    参数:
+    top_y, bottom_y, left_x, right_x (int | None): 检测行带的区域，None 表示图像边缘。
+    max_skew (float): 允许的最大倾斜角（度），0 表示不做倾斜校正。
+    min_line_height (int): 最小行高(像素)，更矮的墨迹区域视为横线或噪点。
+    其余参数同 get_page_split_positions。
+
+    返回:
+    dict: 见 segment_grid；出错时返回 (错误信息, 状态码)。
+    """
+    try:
+        key, gray = page_cache.gray(img_data)
+
+        if gray is None:
+            return {'error': '无法解码图像数据'}, 400
+
+        height, width = gray.shape
+        top_y = max(0, top_y)
+        bottom_y = height if bottom_y is None else max(top_y, min(height, bottom_y))
+        left_x = max(0, left_x)
+        right_x = width if right_x is None else max(left_x, min(width, right_x))
+        if bottom_y == top_y or right_x == left_x:
+            return {'error': '检测区域无效，图像为空'}, 400
+
+        binary = page_cache.binary(key, gray)
+        logger.debug(f"原始图像尺寸: {gray.shape}，检测区域: {top_y}-{bottom_y} × {left_x}-{right_x}")
+        return run_job(segment_grid, binary, gray if DEBUG_PLOT_MODE != 'off' else None,
+                       top_y, bottom_y, left_x, right_x, min_char_width, max_char_width, max_skew, min_line_height,
+                       options)
+
+    except ServiceBusy:
+        raise
+    except Exception as e:
+        logger.exception(f"在get_page_grid函数中发生异常: {e}")
+        return {'error': str(e)}, 500
+
+def even_line_bands(top_y, bottom_y, line_count):
+    """
+    按 cut_3.html 的规则把 [top_y, bottom_y] 等分为 line_count + 1 条行带。
+
+    返回:
+    list: [(top_y, bottom_y), ...]，坐标四舍五入为整数。
+    """
+    line_spacing = (bottom_y - top_y) / (line_count + 1)
+    bands = []
+    for i in range(line_count + 1):
+        line_top = top_y + i * line_spacing
+        # 与前端的 Math.round 保持一致（0.5 向上取整）
+        bands.append((int(np.floor(line_top + 0.5)), int(np.floor(line_top + line_spacing + 0.5))))
+    return bands
+
+def shear_page(image, slope, border=0):
+    """
+    倾斜校正：逐列上下平移，dst(x, y) = src(x, y + slope * x)。
+
+    校正后倾斜的文字行变为水平，横坐标不变，因此分割点可以直接用于原图；
+    最近邻取样，像素值不变。slope 为 0 时原样返回。
+    """
+    if not slope:
+        return image
+    height, width = image.shape[:2]
+    matrix = np.float32([[1, 0, 0], [slope, 1, 0]])
+    return cv2.warpAffine(image, matrix, (width, height), flags=cv2.INTER_NEAREST | cv2.WARP_INVERSE_MAP,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=border)
+
+def skew_slope(skew):
+    """倾斜角（度，右侧向下为正）对应的每像素纵向偏移。"""
+    return float(np.tan(np.radians(skew)))
+
+def estimate_skew(binary, max_skew=2.0, step=0.1, strips=32):
+    """
+    用水平投影估计页面倾斜角。
+
+    把页面分成若干竖条，分别求水平投影；对每个候选角度按竖条中心的纵向偏移错开后相加，
+    文字行对齐时投影峰谷最分明（平方和最大）。得分相同时取绝对值较小的角度。
+
+    返回:
+    float: 倾斜角（度），右侧向下为正，范围 [-max_skew, max_skew]。
+    """
+    height, width = binary.shape
+    if max_skew <= 0 or height == 0 or width == 0:
+        return 0.0
+    strips = max(1, min(strips, width))
+    edges = np.linspace(0, width, strips + 1).astype(int)
+    profiles = np.add.reduceat(binary > 0, edges[:-1], axis=1, dtype=np.int64)
+    centers = (edges[:-1] + edges[1:]) / 2
+
+    count = int(round(max_skew / step))
+    angles = np.arange(-count, count + 1) * step
+    angles = angles[np.argsort(np.abs(angles), kind='stable')]
+    pad = int(np.ceil(abs(skew_slope(max_skew)) * width)) + 1
+    best_angle, best_score = 0.0, -1
+    for angle in angles:
+        shifts = np.rint(skew_slope(angle) * centers).astype(int)
+        combined = np.zeros(height + 2 * pad, np.int64)
+        for strip, shift in enumerate(shifts):
+            combined[pad - shift:pad - shift + height] += profiles[:, strip]
+        score = int(np.dot(combined, combined))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return round(best_angle, 6)
+
+def find_line_bands(horizontal_projection, min_line_height=15, min_gap=3, ink_threshold=1):
+    """
+    由（倾斜校正后的）水平投影找出文字行，返回首尾相接的行带。
+
+    参数:
+    horizontal_projection (numpy.ndarray): 每一行的墨迹像素数。
+    min_line_height (int): 低于该高度的墨迹区域（横线、噪点）不视为文字行。
+    min_gap (int): 小于该高度的空白视为行内空隙（如 “二” 字中间），不断行。
+    ink_threshold (int): 墨迹像素数超过该值的行才视为有墨迹。
+
+    返回:
+    list: [(top_y, bottom_y), ...]，坐标相对于投影起点。相邻两行以空白的中点为界，
+          首末行向外留出空白高度中位数的一半。
+    """
+    projection = np.asarray(horizontal_projection)
+    starts, stops = _runs(projection > ink_threshold)
+    if len(starts) == 0:
+        return []
+
+    # 合并行内空隙，再去掉过矮的区域
+    group = np.flatnonzero(np.concatenate(([True], starts[1:] - stops[:-1] >= min_gap)))
+    starts, stops = starts[group], stops[np.append(group[1:] - 1, len(stops) - 1)]
+    tall = stops - starts >= min_line_height
+    starts, stops = starts[tall], stops[tall]
+    if len(starts) == 0:
+        return []
+
+    gaps = starts[1:] - stops[:-1]
+    pad = int(np.median(gaps)) // 2 if len(gaps) else 0
+    bounds = (stops[:-1] + starts[1:]) // 2
+    tops = np.concatenate(([max(0, starts[0] - pad)], bounds))
+    bottoms = np.concatenate((bounds, [min(len(projection), stops[-1] + pad)]))
+    return [(int(top_y), int(bottom_y)) for top_y, bottom_y in zip(tops, bottoms)]
+
+def segment_grid(binary, gray, top_y, bottom_y, left_x, right_x, min_char_width=30, max_char_width=80,
+                 max_skew=2.0, min_line_height=15, options=None):
+    """
+    一次完成整页的行带检测和行内分割，可在进程池中执行。
+
+    在 [top_y, bottom_y) × [left_x, right_x) 区域内估计倾斜角并校正，由水平投影找出文字行，
+    再对每一行计算分割点。gray 仅用于调试图，可为 None。
+
+    返回:
+    dict: skew（倾斜角，度）、lines（校正后坐标中的行带）、split_positions（各行分割点）、
+          cells（[[行带序号, 格序号, 左, 上, 右, 下], ...]，原图坐标，见 cell_rects）
+    """
+    region = binary[top_y:bottom_y, left_x:right_x]
+    with timed('skew_estimate'):
+        skew = estimate_skew(region, max_skew)
+    slope = skew_slope(skew)
+
+    # 整页按 x = 0 校正，行带和分割点可直接交给 /segment_page、/crop（带上 skew）
+    with timed('deskew'):
+        deskewed = shear_page(binary, slope)
+    with timed('line_detect'):
+        projection = np.count_nonzero(deskewed[top_y:bottom_y, left_x:right_x], axis=1)
+        bands = [(top + top_y, bottom + top_y) for top, bottom in find_line_bands(projection, min_line_height)]
+    logger.debug(f"倾斜角: {skew}°，找到 {len(bands)} 行。")
+
+    binary_bands = [deskewed[top:bottom, left_x:right_x] for top, bottom in bands]
+    gray_bands = None
+    if gray is not None:
+        deskewed_gray = shear_page(gray, slope, 255)
+        gray_bands = [deskewed_gray[top:bottom, left_x:right_x] for top, bottom in bands]
+    splits = split_bands(binary_bands, gray_bands, left_x, min_char_width, max_char_width, options)
+
+    height, width = binary.shape
+    cells = []
+    for index, part, cell_left, cell_right in cell_rects(bands, splits, width):
+        # 每一格按其中心所在的横坐标还原倾斜
+        offset = slope * (cell_left + cell_right) / 2
+        top, bottom = bands[index]
+        cells.append([index, part, cell_left,
+                      min(height, max(0, int(np.floor(top + offset + 0.5)))),
+                      cell_right,
+                      min(height, max(0, int(np.floor(bottom + offset + 0.5))))])
+
+    return {'skew': skew, 'lines': bands, 'split_positions': splits, 'cells': cells}
+
+def cell_rects(bands, splits, width):
+    """
+    按 cut_3.html 的规则把每条行带按分割线切成格子：左边缘到第一条分割线、相邻两条分割线之间、
+    最后一条分割线到右边缘各为一格，没有分割线的行不切。分割线横坐标四舍五入并裁剪到图像范围内。
+
+    返回:
+    list: [(行带序号, 格序号, left_x, right_x)]，格序号从 1 开始，与前端下载的文件名一致；宽度为 0 的格跳过。
+    """
+    cells = []
+    for index, line_splits in enumerate(splits[:len(bands)]):
+        if not line_splits:
+            continue
+        xs = [0] + [min(width, max(0, int(np.floor(x + 0.5)))) for x in line_splits] + [width]
+        for part, (left_x, right_x) in enumerate(zip(xs, xs[1:]), start=1):
+            if right_x > left_x:
+                cells.append((index, part, left_x, right_x))
+    return cells
+
+def crop_cells(band_images, cells, names=None, process=False, taken=(), ink_threshold=None, blank_threshold=5,
+               center_threshold=180, noise_threshold=180, contrast_factor=0.9):
+    """
+    从行带中切出各格并编码为 PNG，可在进程池中执行。
+
+    参数:
+    band_images (list): 各行带的灰度图。
+    cells (list): cell_rects 的结果。
+    names (str | None): 按顺序对应各格（筛掉空白格后）的文字。给出时按字库命名规则命名，
+        重复的字依次命名为 字-2、字-3 …（同 rename.py）；否则使用前端下载时的文件名。
+    process (bool): 筛掉空白格（同 rename.py），并按 glyph_pipeline.py 的方式居中、去噪。
+        居中只用于中文字；未给出文字时所有格都居中。
+    taken (iterable): 已占用的文件名，命名时跳过。
+    ink_threshold (int | None): 给出时另返回 entries，即各文件的字库清单项 [文件名, 宽, 高, 墨迹包围盒]，
+        写入字库后不必重新解码即可更新 manifest.json。
+    其余参数与 rename.py、glyph_pipeline.py 的默认值相同。
+
+    返回:
+    dict: files（[(文件名, PNG 字节)]）、blank（空白格）、unused（文字用完后剩下的格）、unused_chars（多出的文字），
+          以及给出 ink_threshold 时的 entries
+    """
+    lut = denoise_lut(noise_threshold, contrast_factor) if process else None
+    taken = set(taken)
+    files, blank, unused, entries = [], [], [], []
+    used_chars = 0
+    for index, part, left_x, right_x in cells:
+        default_name = f'cropped_image_row-{index + 1}_part-{part}.png'
+        # 行带的切片是视图，不复制像素
+        cell = band_images[index][:, left_x:right_x]
+        if process and is_blank_array(cell, blank_threshold):
+            blank.append(default_name)
+            continue
+
+        char = None
+        if names is not None:
+            if used_chars >= len(names):
+                unused.append(default_name)
+                continue
+            char = names[used_chars]
+            used_chars += 1
+
+        if process:
+            with timed('glyph_process'):
+                if char is None or contains_chinese(char):
+                    top, bottom = ink_rows(cell, center_threshold)
+                else:
+                    top, bottom = 0, cell.shape[0] - 1
+                cell = compose_glyph(cell, top, bottom, lut)
+
+        filename = default_name if char is None else target_name(char, '.png', taken)
+        with timed('png_encode'):
+            files.append((filename, cv2.imencode('.png', cell)[1].tobytes()))
+        if ink_threshold is not None:
+            entries.append([filename, cell.shape[1], cell.shape[0], ink_box(cell, ink_threshold)])
+
+    result = {
+        'files': files,
+        'blank': blank,
+        'unused': unused,
+        'unused_chars': names[used_chars:] if names is not None else '',
+    }
+    if ink_threshold is not None:
+        result['entries'] = entries
+    return result
+
+def get_page_crops(img_data, bands, splits, names=None, process=False, taken=(), skew=0.0, ink_threshold=None):
+    """
+    对整页图像一次解码，按行带和分割线切出所有格子；skew 非 0 时先做倾斜校正，见 shear_page。
+    ink_threshold 见 crop_cells。
+
+    返回:
+    dict: 见 crop_cells；出错时返回 (错误信息, 状态码)。
+    """
+    try:
+        _, gray = page_cache.gray(img_data)
+
+        if gray is None:
+            return {'error': '无法解码图像数据'}, 400
+        with timed('deskew'):
+            gray = shear_page(gray, skew_slope(skew), 255)
+
+        band_images = []
+        with timed('crop'):
+            for top_y, bottom_y in bands:
+                # 与前端的垂直平移配合时，首末行可能越界，这里裁剪到图像范围内
+                top_y = max(0, top_y)
+                bottom_y = max(top_y, min(gray.shape[0], bottom_y))
+                band_images.append(gray[top_y:bottom_y])
+
+        cells = [cell for cell in cell_rects(bands, splits, gray.shape[1]) if band_images[cell[0]].shape[0] > 0]
+        if not cells:
+            return {'error': '没有可裁剪的区域。请先插入至少一条竖直分割线。'}, 400
+
+        # 只把有格子的行带传给计算进程
+        needed = {cell[0] for cell in cells}
+        band_images = [band if index in needed else None for index, band in enumerate(band_images)]
+        logger.debug(f"原始图像尺寸: {gray.shape}，格子数: {len(cells)}")
+        return run_job(crop_cells, band_images, cells, names, process, taken, ink_threshold)
+
+    except ServiceBusy:
+        raise
+    except Exception as e:
+        logger.exception(f"在get_page_crops函数中发生异常: {e}")
         return {'error': str(e)}, 500
 
+class _ChunkBuffer(io.RawIOBase):
+    """只写的缓冲区，供 zipfile 写入后按块取出，实现流式 ZIP。"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def zip_stream(files):
+    """逐个文件生成 ZIP 数据块；PNG 本身已压缩，不再压缩。"""
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        for filename, data in files:
+            zf.writestr(filename, data)
+            yield buffer.take()
+    yield buffer.take()
+
+def _parse_params(fields):
+    """将表单或查询字符串中的参数转为数值；lines、splits 为 JSON 字符串，names、output、profile 保持字符串。"""
+    params = {}
+    for key, value in fields.items():
+        if key in ('lines', 'splits'):
+            params[key] = json.loads(value)
+            continue
+        if key in ('names', 'output', 'profile'):
+            params[key] = value
+            continue
+        try:
+            params[key] = int(value)
+        except ValueError:
+            try:
+                params[key] = float(value)
+            except ValueError:
+                params[key] = value
+    return params
+
+def read_segment_request():
+    """
+    读取分割请求中的图像字节和其余参数，支持三种请求格式:
+    - application/json: image_data 为 data URL（或纯 base64），其余参数同在 JSON 中
+    - multipart/form-data: 图像放在文件字段 image 中，其余参数为表单字段
+    - application/octet-stream 或 image/*: 请求体即图像，参数放在查询字符串中
+    表单和查询字符串中的 lines 需为 JSON 字符串。
+
+    返回:
+    tuple: (图像字节，缺失时为 None, 参数字典)
+    """
+    if request.files:
+        with timed('read_body'):
+            upload = request.files.get('image') or next(iter(request.files.values()))
+            return upload.read(), _parse_params(request.form)
+
+    if request.mimetype == 'application/octet-stream' or request.mimetype.startswith('image/'):
+        with timed('read_body'):
+            return request.get_data() or None, _parse_params(request.args)
+
+    with timed('read_body'):
+        data = request.get_json(silent=True) or {}
+    if 'image_data' not in data:
+        return None, data
+    with timed('base64_decode'):
+        image_data_base64 = data['image_data'].split(',')[-1] # 移除 data:image/png;base64,
+        return base64.b64decode(image_data_base64), data
+
+def load_profiles(path=None):
+    """
+    读取扫描仪配置文件中的 {名称: 分割参数}；文件修改时间不变时使用缓存，文件不存在时为空。
+
+    文件格式见 segment_sweep.py --save-profile：
+    {"profiles": {"camscanner": {"min_char_width": 30, ..., "score": {...}}, ...}}
+    """
+    path = path or PROFILES_PATH
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+    if _profiles['mtime_ns'] != mtime:
+        with open(path, encoding='utf-8') as f:
+            _profiles['profiles'] = json.load(f).get('profiles', {})
+        _profiles['mtime_ns'] = mtime
+    return _profiles['profiles']
+
+def split_params(data):
+    """
+    由请求参数得到 (min_char_width, max_char_width, options)。
+
+    依次以 SPLIT_DEFAULTS、profile 指定的扫描仪配置、请求中显式给出的参数为准。
+    profile 不存在时抛出 KeyError。
+    """
+    params = dict(SPLIT_DEFAULTS)
+    if data.get('profile'):
+        profile = load_profiles().get(data['profile'])
+        if profile is None:
+            raise KeyError(data['profile'])
+        params.update((key, profile[key]) for key in SPLIT_DEFAULTS if key in profile)
+    params.update((key, data[key]) for key in SPLIT_DEFAULTS if key in data)
+    options = {key: params[key] for key in SPLIT_OPTION_KEYS}
+    return params['min_char_width'], params['max_char_width'], options
+
+def _busy_response():
+    logger.warning("分割进程池已满，返回 429。")
+    busy_total.inc()
+    response = jsonify({'error': '服务繁忙，请稍后重试'})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
 @app.route('/segment', methods=['POST'])
 def segment_image():
     """
     处理 POST 请求，对图片进行自动分割。
-    请求体应为 JSON 格式:
+    请求体可为 JSON 格式:
     {
         "image_data": "<base64_encoded_image_string>",
         "top_y": 0,
         "bottom_y": 100,
         "left_x": 0,
-        "right_x": 200
+        "right_x": 200,
+        // 以下可选：扫描仪配置（见 segment_sweep.py），以及覆盖配置的分割参数，默认见 SPLIT_DEFAULTS
+        "profile": "camscanner",
+        "min_char_width": 30, "max_char_width": 80,
+        "zero_run": 15, "savgol_window": 11, "valley_threshold": 2000
     }
+    也可用 multipart/form-data 或 application/octet-stream 直接上传图像，
+    参见 read_segment_request。
     """
-    data = request.json
-    
     # 添加日志：打印收到的请求体
-    print("收到 /segment POST请求。")
-    print(f"请求数据: {data.keys()}")
-
-    if not data or 'image_data' not in data or 'top_y' not in data or 'bottom_y' not in data or 'left_x' not in data or 'right_x' not in data:
-        print("错误: 无效的请求体。")
-        return jsonify({'error': '无效的请求体'}), 400
+    logger.debug("收到 /segment POST请求。")
 
     try:
-        # 从 JSON 中获取数据
-        image_data_base64 = data['image_data'].split(',')[1] # 移除 data:image/png;base64,
-        image_bytes = base64.b64decode(image_data_base64)
+        image_bytes, data = read_segment_request()
+        logger.debug(f"请求数据: {data.keys()}")
+
+        if image_bytes is None or 'top_y' not in data or 'bottom_y' not in data or 'left_x' not in data or 'right_x' not in data:
+            logger.warning("错误: 无效的请求体。")
+            return jsonify({'error': '无效的请求体'}), 400
+
         top_y = data['top_y']
         bottom_y = data['bottom_y']
         left_x = data['left_x']
         right_x = data['right_x']
-        
-        # 全能扫描王：(30, 80)
-        min_char_width = data.get('min_char_width', 30)
-        max_char_width = data.get('max_char_width', 80)
-        
+
+        try:
+            min_char_width, max_char_width, options = split_params(data)
+        except KeyError as e:
+            return jsonify({'error': f'未知的 profile: {e.args[0]}'}), 400
+
         # 调用核心分割函数
         result = get_vertical_split_positions(
-            image_bytes, 
-            top_y, 
-            bottom_y, 
-            left_x, 
+            image_bytes,
+            top_y,
+            bottom_y,
+            left_x,
             right_x,
             min_char_width,
-            max_char_width
+            max_char_width,
+            options
         )
-        
-        if isinstance(result, dict) and 'error' in result:
-            print(f"核心分割函数返回错误: {result['error']}")
-            return jsonify(result), 500
-        
-        print(f"成功处理请求。返回 {len(result)} 个分割点。")
+
+        if isinstance(result, tuple):
+            error, status = result
+            logger.warning(f"核心分割函数返回错误: {error['error']}")
+            return jsonify(error), status
+
+        logger.debug(f"成功处理请求。返回 {len(result)} 个分割点。")
         return jsonify({'split_positions': result}), 200
 
+    except ServiceBusy:
+        return _busy_response()
     except Exception as e:
-        print(f"在segment_image函数中发生异常: {e}")
+        logger.exception(f"在segment_image函数中发生异常: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/segment_page', methods=['POST'])
+def segment_page():
+    """
+    处理 POST 请求，一次请求完成整页所有行的自动分割。
+    请求体为 JSON 格式时，行带二选一:
+    {
+        "image_data": "<base64_encoded_image_string>",
+        "lines": [[top_y, bottom_y], ...],
+        // 或者按 cut_3.html 的规则等分：
+        "top_y": 0,
+        "bottom_y": 1000,
+        "line_count": 25,
+        "left_x": 0,        // 可选，默认 0
+        "right_x": 200,     // 可选，默认图像宽度
+        "skew": 0.5,        // 可选，/segment_grid 返回的倾斜角，lines 为校正后的坐标
+        "profile": "camscanner"  // 可选，以及其余分割参数，同 /segment
+    }
+    也可用 multipart/form-data 或 application/octet-stream 直接上传图像，
+    参见 read_segment_request。
+    返回 {"lines": [[top_y, bottom_y], ...], "split_positions": [[...], ...]}。
+    """
+    logger.debug("收到 /segment_page POST请求。")
+
+    try:
+        image_bytes, data = read_segment_request()
+
+        if image_bytes is None:
+            logger.warning("错误: 无效的请求体。")
+            return jsonify({'error': '无效的请求体'}), 400
+
+        if 'lines' in data:
+            bands = [(int(top_y), int(bottom_y)) for top_y, bottom_y in data['lines']]
+        elif 'top_y' in data and 'bottom_y' in data and 'line_count' in data:
+            line_count = int(data['line_count'])
+            if line_count < 0 or data['top_y'] >= data['bottom_y']:
+                logger.warning("错误: 行带参数无效。")
+                return jsonify({'error': '需要 line_count >= 0 且 top_y < bottom_y'}), 400
+            bands = even_line_bands(data['top_y'], data['bottom_y'], line_count)
+        else:
+            logger.warning("错误: 缺少行带参数。")
+            return jsonify({'error': '需要提供 lines，或 top_y、bottom_y 和 line_count'}), 400
+
+        try:
+            min_char_width, max_char_width, options = split_params(data)
+        except KeyError as e:
+            return jsonify({'error': f'未知的 profile: {e.args[0]}'}), 400
+
+        result = get_page_split_positions(
+            image_bytes,
+            bands,
+            data.get('left_x', 0),
+            data.get('right_x'),
+            min_char_width,
+            max_char_width,
+            float(data.get('skew', 0.0)),
+            options
+        )
+
+        if isinstance(result, tuple):
+            error, status = result
+            logger.warning(f"整页分割函数返回错误: {error['error']}")
+            return jsonify(error), status
+
+        logger.debug(f"成功处理请求。共 {len(result)} 行。")
+        return jsonify({'lines': bands, 'split_positions': result}), 200
+
+    except ServiceBusy:
+        return _busy_response()
+    except Exception as e:
+        logger.exception(f"在segment_page函数中发生异常: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/segment_grid', methods=['POST'])
+def segment_grid_route():
+    """
+    处理 POST 请求，自动找出文字行（允许轻微倾斜）并分割，一次返回整页的格子。
+    请求格式同 /segment_page，但不需要行带；可选参数:
+    {
+        "top_y": 0, "bottom_y": 1000, "left_x": 0, "right_x": 200,  // 检测区域，默认整页
+        "min_char_width": 30, "max_char_width": 80,  // 以及 profile 等分割参数，同 /segment
+        "max_skew": 2.0,         // 最大倾斜角（度），0 表示不校正
+        "min_line_height": 15    // 最小行高(像素)
+    }
+    返回 {"skew": 倾斜角, "lines": [[top_y, bottom_y], ...], "split_positions": [[...], ...],
+          "cells": [[行带序号, 格序号, 左, 上, 右, 下], ...]}。
+    lines 为倾斜校正后的坐标：原图中第 i 行在横坐标 x 处的上下边界为 lines[i] + tan(skew) × x；
+    lines、split_positions 连同 skew 可直接交给 /segment_page 和 /crop。
+    """
+    logger.debug("收到 /segment_grid POST请求。")
+
+    try:
+        image_bytes, data = read_segment_request()
+
+        if image_bytes is None:
+            logger.warning("错误: 无效的请求体。")
+            return jsonify({'error': '无效的请求体'}), 400
+
+        try:
+            min_char_width, max_char_width, options = split_params(data)
+        except KeyError as e:
+            return jsonify({'error': f'未知的 profile: {e.args[0]}'}), 400
+
+        result = get_page_grid(
+            image_bytes,
+            int(data.get('top_y', 0)),
+            None if data.get('bottom_y') is None else int(data['bottom_y']),
+            int(data.get('left_x', 0)),
+            None if data.get('right_x') is None else int(data['right_x']),
+            min_char_width,
+            max_char_width,
+            float(data.get('max_skew', 2.0)),
+            int(data.get('min_line_height', 15)),
+            options
+        )
+
+        if isinstance(result, tuple):
+            error, status = result
+            logger.warning(f"整页网格函数返回错误: {error['error']}")
+            return jsonify(error), status
+
+        logger.debug(f"成功处理请求。倾斜角 {result['skew']}°，共 {len(result['lines'])} 行，{len(result['cells'])} 格。")
+        return jsonify(result), 200
+
+    except ServiceBusy:
+        return _busy_response()
+    except Exception as e:
+        logger.exception(f"在segment_grid_route函数中发生异常: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/crop', methods=['POST'])
+def crop_page():
+    """
+    处理 POST 请求，按行带和分割线一次切出整页的所有格子，代替前端逐格编码。
+    请求格式同 /segment_page（行带只能用 lines 给出），另外:
+    {
+        "splits": [[x, ...], ...],  // 与 lines 一一对应的竖直分割线
+        "skew": 0.5,                // 可选，/segment_grid 返回的倾斜角，lines 为校正后的坐标
+        "names": "...",             // 可选，按顺序对应各格的文字，按字库命名规则命名（同 rename.py）
+        "process": true,            // 可选，筛掉空白格并居中、去噪（同 rename.py + glyph_pipeline.py）
+        "output": "zip"             // zip（默认）：流式返回 ZIP；
+                                    // library：处理后作为新的变体直接写入字库并更新清单，需要 names
+    }
+    ZIP 中的图片为灰度图，格子数和空白格数在响应头 X-Crop-Count、X-Crop-Blank 中；
+    写入字库时返回 {"written": [...], "blank": [...], "unused": [...], "unused_chars": "..."}。
+    """
+    logger.debug("收到 /crop POST请求。")
+
+    try:
+        image_bytes, data = read_segment_request()
+
+        if image_bytes is None or 'lines' not in data or 'splits' not in data:
+            logger.warning("错误: 无效的请求体。")
+            return jsonify({'error': '需要提供图像、lines 和 splits'}), 400
+
+        bands = [(int(top_y), int(bottom_y)) for top_y, bottom_y in data['lines']]
+        names = data.get('names')
+        if names is not None:
+            names = ''.join(str(names).split())
+        process = data.get('process', False) in (True, 1, '1', 'true', 'on')
+        output = data.get('output', 'zip')
+        skew = float(data.get('skew', 0.0))
+
+        if output == 'library':
+            if not names:
+                return jsonify({'error': '写入字库需要提供 names'}), 400
+            with _library_lock:
+                os.makedirs(LIBRARY_DIR, exist_ok=True)
+                # 作为新的变体加入，不覆盖字库中已有的字图
+                result = get_page_crops(image_bytes, bands, data['splits'], names, True, os.listdir(LIBRARY_DIR), skew,
+                                        INK_THRESHOLD)
+                if isinstance(result, tuple):
+                    error, status = result
+                    return jsonify(error), status
+                for filename, png in result['files']:
+                    with open(os.path.join(LIBRARY_DIR, filename), 'wb') as f:
+                        f.write(png)
+                if result['files']:
+                    # 只加入新写入的字图，不重新解码整个字库
+                    update_manifest(LIBRARY_DIR, result['entries'], INK_THRESHOLD)
+            logger.info(f"已写入字库 {LIBRARY_DIR}: {len(result['files'])} 张，空白 {len(result['blank'])} 张。")
+            return jsonify({
+                'written': [filename for filename, _ in result['files']],
+                'blank': result['blank'],
+                'unused': result['unused'],
+                'unused_chars': result['unused_chars'],
+            }), 200
+
+        if output != 'zip':
+            return jsonify({'error': f'未知的 output: {output}'}), 400
+
+        result = get_page_crops(image_bytes, bands, data['splits'], names, process, skew=skew)
+        if isinstance(result, tuple):
+            error, status = result
+            logger.warning(f"裁剪函数返回错误: {error['error']}")
+            return jsonify(error), status
+
+        logger.debug(f"成功处理请求。共 {len(result['files'])} 格。")
+        return Response(zip_stream(result['files']), mimetype='application/zip', headers={
+            'Content-Disposition': 'attachment; filename="cropped_images.zip"',
+            'X-Crop-Count': str(len(result['files'])),
+            'X-Crop-Blank': str(len(result['blank'])),
+        })
+
+    except ServiceBusy:
+        return _busy_response()
+    except Exception as e:
+        logger.exception(f"在crop_page函数中发生异常: {e}")
+        return jsonify({'error': str(e)}), 500
+
+busy_total = segment_metrics.register(segment_metrics.Counter('segment_busy_total', '进程池已满、以 429 拒绝的请求数'))
+for _name, _help, _field, _kind in [
+    ('segment_page_cache_hits_total', '已解码页面缓存命中次数', 'hits', 'counter'),
+    ('segment_page_cache_misses_total', '已解码页面缓存未命中次数', 'misses', 'counter'),
+    ('segment_page_cache_evictions_total', '已解码页面缓存淘汰次数', 'evictions', 'counter'),
+    ('segment_page_cache_entries', '已解码页面缓存中的页面数', 'entries', 'gauge'),
+    ('segment_page_cache_bytes', '已解码页面缓存占用的字节数', 'bytes', 'gauge'),
+]:
+    segment_metrics.register(segment_metrics.Gauge(_name, _help, lambda field=_field: page_cache.stats()[field], _kind))
+segment_metrics.register(segment_metrics.Gauge('segment_jobs_in_flight', '已提交到进程池、尚未返回的计算任务数',
+                                               lambda: _jobs_in_flight))
+
+@app.before_request
+def _begin_timing():
+    g.request_start = time.perf_counter()
+    segment_metrics.begin()
+
+@app.after_request
+def _finish_timing(response):
+    """记录请求耗时和各阶段耗时；开启 SERVER_TIMING 时写入 Server-Timing 响应头。"""
+    timings = segment_metrics.end()
+    if request.endpoint in (None, 'metrics', 'static') or 'request_start' not in g:
+        return response
+    total = time.perf_counter() - g.request_start
+    segment_metrics.observe_request(request.endpoint, response.status_code, total, timings)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = segment_metrics.server_timing(timings, total)
+        response.headers['Timing-Allow-Origin'] = '*'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 文本格式的指标：请求数、请求与各阶段耗时直方图、页面缓存和进程池状态。"""
+    return Response(segment_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    """返回已解码页面缓存的命中、未命中、淘汰次数和内存占用。"""
+    return jsonify(page_cache.stats()), 200
+
+def main():
+    parser = argparse.ArgumentParser(description='自动分割服务')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址 (默认: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=5001, help='端口 (默认: 5001)')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count() or 1,
+                        help='分割计算进程数，0 表示在请求线程内计算 (默认: CPU 核数)')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='排队和运行中的分割任务上限，超出返回 429 (默认: 进程数 × 4)')
+    parser.add_argument('--debug-plot', choices=['off', 'sync', 'deferred'], default=None,
+                        help='调试图模式，覆盖环境变量 SEGMENT_DEBUG_PLOT')
+    parser.add_argument('--debug-sample', type=int, default=None,
+                        help='每 N 次分割绘制一次调试图，覆盖环境变量 SEGMENT_DEBUG_SAMPLE')
+    parser.add_argument('--library', default=None,
+                        help='/crop 写入的字库文件夹，覆盖环境变量 SEGMENT_LIBRARY (默认: output_chars_ds)')
+    parser.add_argument('--server-timing', action='store_true',
+                        help='在响应头 Server-Timing 中返回各阶段耗时，同环境变量 SEGMENT_SERVER_TIMING=1')
+    parser.add_argument('--profiles', default=None,
+                        help='扫描仪分割参数配置文件，覆盖环境变量 SEGMENT_PROFILES (默认: segment_profiles.json)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出逐请求的跟踪日志')
+    parser.add_argument('--debug', action='store_true', help='使用 Flask 调试模式（单进程，自动重载）')
+    args = parser.parse_args()
+
+    global DEBUG_PLOT_MODE, DEBUG_PLOT_SAMPLE_EVERY, LIBRARY_DIR, PROFILES_PATH, SERVER_TIMING
+    if args.server_timing:
+        SERVER_TIMING = True
+    if args.library is not None:
+        LIBRARY_DIR = args.library
+    if args.profiles is not None:
+        PROFILES_PATH = args.profiles
+    if args.debug_plot is not None:
+        DEBUG_PLOT_MODE = args.debug_plot
+    if args.debug_sample is not None:
+        DEBUG_PLOT_SAMPLE_EVERY = max(1, args.debug_sample)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(processName)s %(levelname)s %(message)s')
+    if not args.verbose:
+        # 关闭 werkzeug 的逐请求访问日志
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    if args.debug:
+        app.run(host=args.host, port=args.port, debug=True)
+        return
+
+    configure_pool(args.workers, args.max_pending)
+    # 收到 SIGTERM 时正常退出，以便关闭进程池，不留下孤立的计算进程
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info(f"自动分割服务启动: http://{args.host}:{args.port}，计算进程 {args.workers} 个")
+    try:
+        # 请求线程只负责收发数据和查缓存，CPU 密集的分割计算在进程池中执行
+        app.run(host=args.host, port=args.port, threaded=True)
+    finally:
+        configure_pool(0)
+
 if __name__ == '__main__':
-    # 在本地运行服务，可以根据需要更改端口
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    main()
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""
+分割与字图处理热点路径的基准测试。
+
+字图取自 handwriting_chars（按文件名排序取前 N 张），不足时用随机笔画合成的字图补足；
+页面用这些字图拼成（同 segment_regression.compose_page），随机种子固定，结果可复现。
+每项测试先预热，再重复计时，报告吞吐量、延迟分位数和峰值内存（tracemalloc 统计的
+Python / numpy 分配，不含 OpenCV 内部缓冲区）。
+
+结果可保存为基线 JSON；与基线比较时，任一项的中位延迟或峰值内存超出阈值即返回非零退出码。
+确认提速后用 --save 更新基线。
+
+示例:
+    python bench.py --save                      # 生成基线 bench_baseline.json
+    python bench.py                             # 与基线比较，退化超过 25% 时失败
+    python bench.py -k split --repeat 20        # 只跑名称含 split 的测试
+    python bench.py --synthetic --glyph-count 500
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import auto_segment
+import center
+import glyph_pipeline
+import noise_ds
+import rename
+from segment_regression import compose_page
+
+BASELINE_PATH = 'bench_baseline.json'
+BASELINE_VERSION = 1
+PAGE_WIDTHS = (1600, 3200, 4800)
+LINE_COUNT = 25
+LINE_HEIGHT = 70
+
+def synthetic_glyph(rnd, size=100):
+    """用随机笔画（直线、弧线）和纸张噪点合成一张手写风格的灰度字图。"""
+    img = np.full((size, size), 255, np.uint8)
+    for _ in range(rnd.randint(3, 9)):
+        thickness = rnd.randint(3, 7)
+        color = rnd.randint(0, 60)
+        if rnd.random() < 0.7:
+            p1 = (rnd.randint(15, size - 15), rnd.randint(15, size - 15))
+            p2 = (rnd.randint(15, size - 15), rnd.randint(15, size - 15))
+            cv2.line(img, p1, p2, color, thickness, cv2.LINE_AA)
+        else:
+            center_xy = (rnd.randint(30, size - 30), rnd.randint(30, size - 30))
+            axes = (rnd.randint(8, 30), rnd.randint(8, 30))
+            start = rnd.randint(0, 360)
+            cv2.ellipse(img, center_xy, axes, 0, start, start + rnd.randint(60, 270), color, thickness, cv2.LINE_AA)
+    # 纸张底色和扫描噪点
+    noise = np.random.default_rng(rnd.randint(0, 1 << 30)).normal(0, 6, img.shape)
+    return np.clip(img.astype(float) - 8 + noise, 0, 255).astype(np.uint8)
+
+def make_glyph_set(folder, glyph_dir, count, seed=0, synthetic=False):
+    """
+    在 folder 中准备 count 张字图：先取 glyph_dir 中的样本字图，不足时补合成字图。
+
+    合成字图以 CJK 统一汉字依次命名，center.process_images 会把它们当作中文字居中。
+
+    返回:
+    tuple: (样本字图数, 合成字图数)
+    """
+    os.makedirs(folder, exist_ok=True)
+    samples = []
+    if not synthetic and os.path.isdir(glyph_dir):
+        samples = sorted(f for f in os.listdir(glyph_dir) if f.lower().endswith('.png'))[:count]
+    for filename in samples:
+        shutil.copyfile(os.path.join(glyph_dir, filename), os.path.join(folder, filename))
+
+    rnd = random.Random(seed)
+    made = 0
+    code = 0x4e00
+    while len(samples) + made < count:
+        filename = f'{chr(code)}.png'
+        code += 1
+        if filename in samples:
+            continue
+        cv2.imwrite(os.path.join(folder, filename), synthetic_glyph(rnd))
+        made += 1
+    return len(samples), made
+
+def make_page(glyph_folder, width, seed=0):
+    """用字图拼出一张示例页面，返回 (PNG 字节, 行带列表)。"""
+    page, bands = compose_page(glyph_folder, seed, width, LINE_COUNT, LINE_HEIGHT)
+    return cv2.imencode('.png', page)[1].tobytes(), bands
+
+def percentile(values, q):
+    return float(np.percentile(values, q))
+
+def measure(fn, items, repeat, warmup=1, memory=True):
+    """
+    计时 fn()：预热 warmup 次，再计时 repeat 次；另跑一次统计峰值内存。
+
+    参数:
+    items (int): 每次调用处理的条目数（行、页、字图），用于计算吞吐量。
+
+    返回:
+    dict: p50 / p90 / p99 / mean / min（秒）、throughput（条目/秒，按中位延迟）、peak_kb、items
+    """
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    peak_kb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+
+    p50 = percentile(latencies, 50)
+    return {
+        'p50': p50,
+        'p90': percentile(latencies, 90),
+        'p99': percentile(latencies, 99),
+        'mean': float(np.mean(latencies)),
+        'min': float(np.min(latencies)),
+        'throughput': items / p50 if p50 > 0 else float('inf'),
+        'peak_kb': peak_kb,
+        'items': items,
+    }
+
+def _quiet(fn, *args, **kwargs):
+    """调用 fn 并丢弃其逐文件打印的进度信息。"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+def build_cases(work_dir, glyph_folder, widths, workers):
+    """
+    返回 [(名称, 单位, 条目数, 函数)]。
+
+    页面的解码结果会进入 auto_segment.page_cache，与服务中同一张扫描件反复分割时一致；
+    decode_page 单独统计冷解码和二值化。
+    """
+    cases = []
+    for width in widths:
+        png, bands = make_page(glyph_folder, width)
+        gray = auto_segment.decode_gray_image(png)
+        top, bottom = bands[len(bands) // 2]
+
+        cases.append((f'decode_page[w={width}]', 'page', 1,
+                      lambda png=png: auto_segment.binarize(auto_segment.decode_gray_image(png))))
+        cases.append((f'split_line[w={width}]', 'line', 1,
+                      lambda png=png, top=top, bottom=bottom, width=width:
+                      auto_segment.get_vertical_split_positions(png, top, bottom, 0, width)))
+        cases.append((f'split_page[w={width}]', 'line', len(bands),
+                      lambda png=png, bands=bands: auto_segment.get_page_split_positions(png, bands)))
+        cases.append((f'segment_grid[w={width}]', 'line', len(bands),
+                      lambda png=png: auto_segment.get_page_grid(png)))
+        cases.append((f'split_positions[w={width}]', 'line', len(bands),
+                      lambda gray=gray, bands=bands: [
+                          auto_segment.find_split_positions(np.sum(auto_segment.binarize(gray[t:b]), axis=0))
+                          for t, b in bands]))
+
+    filenames = sorted(f for f in os.listdir(glyph_folder) if f.lower().endswith('.png'))
+    paths = [os.path.join(glyph_folder, f) for f in filenames]
+    images = []
+    for path in paths:
+        with Image.open(path) as img:
+            images.append(img.convert('RGB'))
+    count = len(paths)
+
+    cases.append(('center.find_non_white_region', 'glyph', count,
+                  lambda: [center.find_non_white_region(img) for img in images]))
+    cases.append(('center.process_images', 'glyph', count,
+                  lambda: _quiet(center.process_images, glyph_folder, os.path.join(work_dir, 'centered'),
+                                 workers=workers, force=True)))
+    denoise_dir = os.path.join(work_dir, 'denoised')
+    os.makedirs(denoise_dir, exist_ok=True)
+    cases.append(('noise_ds.remove_noise', 'glyph', count,
+                  lambda: [noise_ds.remove_noise(path, os.path.join(denoise_dir, os.path.basename(path)), 180, 0.9)
+                           for path in paths]))
+    cases.append(('noise_ds.batch_denoise', 'glyph', count,
+                  lambda: _quiet(noise_ds.batch_denoise, glyph_folder, os.path.join(work_dir, 'batch_denoised'), 180, 0.9)))
+    cases.append(('glyph_pipeline.run_pipeline', 'glyph', count,
+                  lambda: _quiet(glyph_pipeline.run_pipeline, glyph_folder, os.path.join(work_dir, 'pipeline'),
+                                 workers=workers)))
+    cases.append(('rename.is_blank_image', 'glyph', count,
+                  lambda: [rename.is_blank_image(path) for path in paths]))
+    return cases
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        print(f"{path} 版本不符，已忽略，请用 --save 重新生成")
+        return None
+    return baseline
+
+def save_baseline(path, results, config):
+    baseline = {
+        'version': BASELINE_VERSION,
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'environment': environment(),
+        'config': config,
+        'results': results,
+    }
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=1)
+    os.replace(path + '.tmp', path)
+
+def compare(results, baseline, max_regression, max_memory_regression):
+    """
+    按中位延迟和峰值内存与基线比较。
+
+    返回:
+    list: 退化的测试 [(名称, 说明)]
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['p50'] / base['p50'] if base['p50'] > 0 else 1.0
+        if ratio > 1 + max_regression:
+            regressions.append((name, f"中位延迟 {base['p50'] * 1000:.2f} → {result['p50'] * 1000:.2f} ms（{ratio - 1:+.0%}）"))
+        if result['peak_kb'] is not None and base.get('peak_kb'):
+            memory_ratio = result['peak_kb'] / base['peak_kb']
+            # 很小的分配量波动不计入
+            if memory_ratio > 1 + max_memory_regression and result['peak_kb'] - base['peak_kb'] > 256:
+                regressions.append((name, f"峰值内存 {base['peak_kb']:.0f} → {result['peak_kb']:.0f} KB（{memory_ratio - 1:+.0%}）"))
+    return regressions
+
+def format_row(name, unit, result, base=None):
+    change = ''
+    if base is not None and base['p50'] > 0:
+        change = f"{result['p50'] / base['p50'] - 1:+.1%}"
+    peak = f"{result['peak_kb']:.0f}" if result['peak_kb'] is not None else '-'
+    return (f"{name:<32} {result['throughput']:>10.1f} {unit + '/s':<8} {result['p50'] * 1000:>9.2f} "
+            f"{result['p90'] * 1000:>9.2f} {result['p99'] * 1000:>9.2f} {peak:>10} {change:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description='分割与字图处理的基准测试')
+    parser.add_argument('-g', '--glyphs', default='handwriting_chars', help='样本字图文件夹 (默认: handwriting_chars)')
+    parser.add_argument('--glyph-count', type=int, default=200, help='字图测试使用的字图数 (默认: 200)')
+    parser.add_argument('--synthetic', action='store_true', help='只使用合成字图，不读取样本字图')
+    parser.add_argument('--widths', type=int, nargs='+', default=list(PAGE_WIDTHS),
+                        help=f"页面宽度 (默认: {' '.join(map(str, PAGE_WIDTHS))})")
+    parser.add_argument('-r', '--repeat', type=int, default=10, help='每项计时次数 (默认: 10)')
+    parser.add_argument('--warmup', type=int, default=1, help='每项预热次数 (默认: 1)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='process_images / run_pipeline 的进程数，固定为 1 便于复现 (默认: 1)')
+    parser.add_argument('-k', '--filter', help='只运行名称包含该字符串的测试')
+    parser.add_argument('--no-memory', action='store_true', help='不统计峰值内存')
+    parser.add_argument('-b', '--baseline', default=BASELINE_PATH, help=f'基线文件 (默认: {BASELINE_PATH})')
+    parser.add_argument('--save', action='store_true', help='把本次结果保存为基线（合并到已有基线中）')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                        help='中位延迟超过基线的比例上限 (默认: 0.25)')
+    parser.add_argument('--max-memory-regression', type=float, default=0.5,
+                        help='峰值内存超过基线的比例上限 (默认: 0.5)')
+    parser.add_argument('--json', help='把本次结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    # 调试图会拖慢分割并写文件，基准测试中始终关闭
+    auto_segment.DEBUG_PLOT_MODE = 'off'
+
+    work_dir = tempfile.mkdtemp(prefix='bench_')
+    try:
+        glyph_folder = os.path.join(work_dir, 'glyphs')
+        samples, made = make_glyph_set(glyph_folder, args.glyphs, args.glyph_count, synthetic=args.synthetic)
+        print(f"字图: 样本 {samples} 张，合成 {made} 张；页面宽度: {', '.join(map(str, args.widths))}；"
+              f"计时 {args.repeat} 次")
+
+        cases = build_cases(work_dir, glyph_folder, args.widths, args.workers)
+        if args.filter:
+            cases = [case for case in cases if args.filter in case[0]]
+
+        baseline = load_baseline(args.baseline)
+        print(f"\n{'测试':<32} {'吞吐量':>10} {'':<8} {'p50(ms)':>9} {'p90(ms)':>9} {'p99(ms)':>9} "
+              f"{'峰值(KB)':>10} {'对比基线':>8}")
+        results = {}
+        for name, unit, items, fn in cases:
+            result = measure(fn, items, args.repeat, args.warmup, not args.no_memory)
+            result['unit'] = unit
+            results[name] = result
+            base = baseline['results'].get(name) if baseline else None
+            print(format_row(name, unit, result, base))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    config = {
+        'glyph_count': args.glyph_count,
+        'synthetic': args.synthetic,
+        'samples': samples,
+        'widths': args.widths,
+        'repeat': args.repeat,
+        'workers': args.workers,
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'config': config, 'results': results}, f, ensure_ascii=False, indent=1)
+
+    if args.save:
+        merged = dict(baseline['results']) if baseline else {}
+        merged.update(results)
+        save_baseline(args.baseline, merged, config)
+        print(f"\n已保存基线 {args.baseline}（{len(results)} 项）")
+        return
+
+    if baseline is None:
+        print(f"\n没有基线 {args.baseline}，用 --save 生成")
+        return
+    if baseline.get('config', {}).get('glyph_count') != args.glyph_count or baseline['config'].get('samples') != samples:
+        print("\n注意：字图数量与基线不同，结果不可直接比较")
+    if baseline.get('environment', {}).get('machine') != environment()['machine']:
+        print("注意：基线来自不同的机器")
+
+    regressions = compare(results, baseline, args.max_regression, args.max_memory_regression)
+    if regressions:
+        print(f"\n{len(regressions)} 项退化超过阈值:")
+        for name, message in regressions:
+            print(f"  {name}: {message}")
+        sys.exit(1)
+    print("\n没有超过阈值的退化。")
+
+if __name__ == '__main__':
+    main()
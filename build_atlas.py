@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+把字库打包成少量图集（sprite sheet）和一个 JSON 索引，供 index.html 按子区域绘制，
+避免排版时为每个字单独请求一张图片。
+
+索引格式 (index.json):
+    {
+      "version": 1,
+      "source": "output_chars_ds",
+      "atlases": [{"file": "atlas-0.png", "width": 2048, "height": 2048}, ...],
+      "glyphs": {"字": [[图集序号, x, y, w, h], ...], ...}
+    }
+每个字的列表按变体序号排列，第一项与逐个加载时使用的字图一致。
+
+输入为 export_glyphs.py 导出的精简字库时，图集中只放各字图的裁剪框，每项为
+[图集序号, x, y, 裁剪宽, 裁剪高, 宽, 高, 裁剪框左, 裁剪框上]；整张空白的字图为 [-1, 0, 0, 0, 0, 宽, 高, 0, 0]。
+
+示例:
+    python build_atlas.py -i output_chars_ds -o atlas
+"""
+import argparse
+import json
+import os
+
+import cv2
+import numpy as np
+
+from glyphs import load_manifest, scan_glyphs
+
+INDEX_NAME = 'index.json'
+
+def pack_shelves(sizes, max_size, padding):
+    """
+    按行（shelf）装箱：从高到低排列，逐行从左到右摆放，放不下时换行，超出高度时换新图集。
+
+    参数:
+    sizes: [(w, h), ...]
+
+    返回:
+    tuple: (每个矩形的 (图集序号, x, y), 每个图集的 (宽, 高))。矩形左侧、上方留 padding，
+    图集宽高到最右、最下的矩形边缘为止，不超过 max_size。
+    """
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    placements = [None] * len(sizes)
+    extents = []
+    atlas, x, y, shelf_height, used_width = -1, 0, 0, 0, 0
+    for i in order:
+        w, h = sizes[i]
+        if w + padding > max_size or h + padding > max_size:
+            raise ValueError(f"字图尺寸 {w}x{h} 超过图集尺寸 {max_size}")
+        if atlas >= 0 and x + w + padding > max_size:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        if atlas < 0 or y + h + padding > max_size:
+            if atlas >= 0:
+                extents.append((used_width, y + shelf_height))
+            atlas, x, y, shelf_height, used_width = atlas + 1, 0, 0, 0, 0
+        placements[i] = (atlas, x + padding, y + padding)
+        x += w + padding
+        used_width = max(used_width, x)
+        shelf_height = max(shelf_height, h + padding)
+    if atlas >= 0:
+        extents.append((used_width, y + shelf_height))
+    return placements, extents
+
+def build_atlas(input_dir, output_dir, max_size=2048, padding=2):
+    # 精简字库的清单中每项带裁剪框，文件可能是 WebP，按清单而不是文件名查找字图
+    manifest = load_manifest(input_dir)
+    if manifest is not None and any(len(entry) > 4 for entries in manifest['glyphs'].values() for entry in entries):
+        glyphs = manifest['glyphs']
+        entries = [(char, entry[0], entry) for char, char_entries in glyphs.items() for entry in char_entries]
+    else:
+        glyphs = scan_glyphs(input_dir)
+        entries = [(char, filename, None) for char, filenames in glyphs.items() for filename in filenames]
+
+    images = []
+    for char, filename, _ in entries:
+        if filename is None:
+            continue
+        # 字库可能含 RGB/RGBA 字图，统一按灰度打包（output_chars_ds 本身就是灰度）
+        img = cv2.imdecode(np.fromfile(os.path.join(input_dir, filename), np.uint8), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise ValueError(f"无法读取字图: {filename}")
+        images.append(img)
+
+    placements, extents = pack_shelves([(img.shape[1], img.shape[0]) for img in images], max_size, padding)
+
+    # 留白处为白色，缩放绘制时边缘采样不会混入相邻字图
+    sheets = [np.full((h, w), 255, np.uint8) for w, h in extents]
+    index = {'version': 1, 'source': os.path.basename(os.path.normpath(input_dir)), 'atlases': [], 'glyphs': {}}
+    packed = iter(zip(images, placements))
+    for char, filename, manifest_entry in entries:
+        if filename is None:
+            index['glyphs'].setdefault(char, []).append([-1, 0, 0, 0, 0, manifest_entry[1], manifest_entry[2], 0, 0])
+            continue
+        img, (atlas, x, y) = next(packed)
+        h, w = img.shape
+        sheets[atlas][y:y + h, x:x + w] = img
+        entry = [atlas, x, y, w, h]
+        if manifest_entry is not None:
+            entry += [manifest_entry[1], manifest_entry[2], manifest_entry[4][0], manifest_entry[4][1]]
+        index['glyphs'].setdefault(char, []).append(entry)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for i, sheet in enumerate(sheets):
+        name = f'atlas-{i}.png'
+        cv2.imwrite(os.path.join(output_dir, name), sheet)
+        index['atlases'].append({'file': name, 'width': sheet.shape[1], 'height': sheet.shape[0]})
+    # 删除上次打包留下的多余图集
+    for name in os.listdir(output_dir):
+        if name.startswith('atlas-') and name.endswith('.png') and name not in {a['file'] for a in index['atlases']}:
+            os.remove(os.path.join(output_dir, name))
+    with open(os.path.join(output_dir, INDEX_NAME), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+
+    print(f"已将 {len(entries)} 张字图（{len(glyphs)} 个字符）打包为 {len(sheets)} 张图集，保存至 {output_dir}")
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description='把字库打包为图集和 JSON 索引')
+    parser.add_argument('-i', '--input', default='output_chars_ds', help='字库文件夹路径 (默认: output_chars_ds)')
+    parser.add_argument('-o', '--output', default='atlas', help='图集输出文件夹 (默认: atlas)')
+    parser.add_argument('--max-size', type=int, default=2048, help='单张图集的最大边长 (默认: 2048)')
+    parser.add_argument('--padding', type=int, default=2, help='字图间距 (默认: 2)')
+    args = parser.parse_args()
+
+    build_atlas(args.input, args.output, args.max_size, args.padding)
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,14 @@
 import os
+import json
 import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 import numpy as np
 
+# 增量处理清单，记录每个输入文件的 mtime/size 和处理参数
+MANIFEST_NAME = '.center_manifest.json'
+
 def contains_chinese(text):
     """检查字符串是否包含中文字符（不包括标点）"""
     for char in text:
@@ -13,73 +19,133 @@ def contains_chinese(text):
 def find_non_white_region(img, threshold=180):
     """检测图像非空白区域的垂直范围"""
     gray = img.convert('L')
-    arr = np.array(gray)
-    height, width = arr.shape
-    
-    # 检测每行是否包含非白像素
-    non_white_rows = []
-    for y in range(height):
-        row = arr[y, :]
-        if np.any(row < threshold):  # 存在深于阈值的像素
-            non_white_rows.append(y)
-    
-    if not non_white_rows:
+    arr = np.asarray(gray)
+    height = arr.shape[0]
+
+    # 一次归约得到所有包含非白像素（深于阈值）的行
+    non_white_rows = np.flatnonzero((arr < threshold).any(axis=1))
+
+    if non_white_rows.size == 0:
         return 0, height - 1  # 全白图像返回整个高度
-    
-    top = min(non_white_rows)
-    bottom = max(non_white_rows)
-    return top, bottom
+
+    return int(non_white_rows[0]), int(non_white_rows[-1])
 
 def center_image_vertically(img, top, bottom):
     """将指定区域居中放置在白色背景上"""
     content_height = bottom - top + 1
     total_height = img.height
     new_img = Image.new('RGB', (img.width, total_height), (255, 255, 255))
-    
+
     # 计算居中位置
     y_offset = max(0, (total_height - content_height) // 2)
-    
+
     # 裁剪非空白区域并粘贴到新位置
     content_block = img.crop((0, top, img.width, bottom + 1))
     new_img.paste(content_block, (0, y_offset))
     return new_img
 
-def process_images(input_dir, output_dir):
-    """处理输入目录中的所有PNG文件"""
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    
-    for filename in os.listdir(input_dir):
-        if not filename.lower().endswith('.png'):
-            continue
-            
-        input_path = os.path.join(input_dir, filename)
-        output_path = os.path.join(output_dir, filename)
-        
+def process_image(input_path, output_path, threshold=180):
+    """处理单个文件：中文字图居中，其余直接复制。返回 (是否成功, 日志信息)。"""
+    filename = os.path.basename(input_path)
+
+    try:
         # 非中文文件直接复制
         if not contains_chinese(filename):
             shutil.copy2(input_path, output_path)
-            print(f"Copied: {filename}")
-            continue
-            
+            return True, f"Copied: {filename}"
+
         # 处理中文文件
-        try:
-            with Image.open(input_path) as img:
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                
-                # 查找非空白区域
-                top, bottom = find_non_white_region(img)
-                
-                # 居中处理并保存
-                centered = center_image_vertically(img, top, bottom)
-                centered.save(output_path)
-                print(f"Processed: {filename} (content height: {bottom-top+1}px)")
-                
-        except Exception as e:
-            print(f"Error processing {filename}: {str(e)}")
+        with Image.open(input_path) as img:
+            if img.mode != 'RGB':
+                img = img.convert('RGB')
+
+            # 查找非空白区域
+            top, bottom = find_non_white_region(img, threshold)
+
+            # 居中处理并保存
+            centered = center_image_vertically(img, top, bottom)
+            centered.save(output_path)
+            return True, f"Processed: {filename} (content height: {bottom-top+1}px)"
+
+    except Exception as e:
+        return False, f"Error processing {filename}: {str(e)}"
+
+def _load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def _process_entry(args):
+    return process_image(*args)
+
+def process_images(input_dir, output_dir, threshold=180, workers=None, force=False):
+    """
+    处理输入目录中的所有PNG文件
+
+    根据输出目录中的清单只处理新增或修改过（mtime/size 变化）的文件，
+    以及处理参数变化后需要重做的文件；force=True 时全部重新处理。
+    输入中已删除的文件，其输出也会被删除。
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    manifest = {} if force else _load_manifest(output_dir)
+    params = {'threshold': threshold}
+
+    filenames = sorted(f for f in os.listdir(input_dir) if f.lower().endswith('.png'))
+    todo = []
+    new_manifest = {}
+    for filename in filenames:
+        stat = os.stat(os.path.join(input_dir, filename))
+        entry = {'mtime': stat.st_mtime, 'size': stat.st_size, 'params': params}
+        new_manifest[filename] = entry
+        if manifest.get(filename) == entry and os.path.exists(os.path.join(output_dir, filename)):
+            continue
+        todo.append(filename)
+
+    # 输入中已删除的文件，删除其对应输出
+    removed = [f for f in manifest if f not in new_manifest]
+    for filename in removed:
+        output_path = os.path.join(output_dir, filename)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+            print(f"Removed: {filename}")
+
+    print(f"{len(todo)} to process, {len(filenames) - len(todo)} unchanged, {len(removed)} removed.")
+
+    tasks = [(os.path.join(input_dir, f), os.path.join(output_dir, f), threshold) for f in todo]
+    failed = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for filename, (ok, message) in zip(todo, executor.map(_process_entry, tasks, chunksize=32)):
+            print(message)
+            if not ok:
+                failed.add(filename)
+    if failed:
+        print(f"{len(failed)} failed, will retry on the next run.")
+
+    # 失败的文件不写入清单，下次运行时重试
+    for filename in failed:
+        new_manifest.pop(filename)
+    _save_manifest(output_dir, new_manifest)
+
+def main():
+    parser = argparse.ArgumentParser(description='竖直方向居中字库中的图片')
+    parser.add_argument('-i', '--input', default='handwriting_chars', help='输入文件夹路径 (默认: handwriting_chars)')
+    parser.add_argument('-o', '--output', default='output_chars', help='输出文件夹路径 (默认: output_chars)')
+    parser.add_argument('-t', '--threshold', type=int, default=180, help='非空白像素阈值 (0-255, 默认: 180)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='进程数 (默认: CPU 核数)')
+    parser.add_argument('-f', '--force', action='store_true', help='忽略清单，全部重新处理')
+    args = parser.parse_args()
+
+    process_images(args.input, args.output, args.threshold, args.workers, args.force)
 
 if __name__ == "__main__":
-    input_directory = "handwriting_chars"  # 修改为你的输入目录
-    output_directory = "output_chars"
-    process_images(input_directory, output_directory)
\ No newline at end of file
+    main()
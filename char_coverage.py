@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+字库覆盖率统计：给定一批文本（如整本小说），统计字库能覆盖多少，
+列出按出现次数排序的缺失字符，以及依次补写这些字后覆盖率的提升。
+
+字库中已有的字记录在索引文件中（默认 .coverage_index.json），
+只在字库文件夹的修改时间变化（增删、重命名字图）时重新扫描文件名。
+文本按块流式读取，不会一次载入内存。
+
+示例:
+    python char_coverage.py novel.txt
+    python char_coverage.py corpus/*.txt -n 100 -o to_write.txt   # to_write.txt 可直接交给 rename.py
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+from glyphs import parse_glyph_name
+
+INDEX_PATH = '.coverage_index.json'
+CHUNK_SIZE = 1 << 20
+
+# 排版时不需要字图的字符（空格、制表符、换行，以及文件开头的 BOM）
+SKIP_CHARS = ' \t\r\n\ufeff'
+# 左边距标记 <[N]>，排版时去掉，与 index.html 的 MARGIN_MARK 相同
+MARGIN_RE = re.compile(r'<\[[+-]?\d+\]>')
+# 块末尾可能是被截断的标记开头
+_PARTIAL_MARGIN_RE = re.compile(r'<(?:\[[+-]?\d*\]?)?$')
+
+def library_chars(folder, index_path=INDEX_PATH):
+    """
+    字库中每个字的变体数。
+
+    结果按文件夹的绝对路径缓存在 index_path 中；文件夹的修改时间不变时直接使用缓存。
+    """
+    folder = os.path.abspath(folder)
+    index = {}
+    if index_path and os.path.exists(index_path):
+        with open(index_path, encoding='utf-8') as f:
+            index = json.load(f)
+
+    mtime = os.stat(folder).st_mtime_ns
+    entry = index.get(folder)
+    if entry and entry['mtime_ns'] == mtime:
+        return entry['chars']
+
+    chars = Counter()
+    with os.scandir(folder) as it:
+        for item in it:
+            parsed = parse_glyph_name(item.name)
+            if parsed is not None:
+                chars[parsed[0]] += 1
+    index[folder] = {'mtime_ns': mtime, 'chars': dict(chars)}
+    if index_path:
+        with open(index_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(index_path + '.tmp', index_path)
+    return index[folder]['chars']
+
+def _layout_text(text):
+    # 与 index.html 的顺序相同：先替换 ——，再去掉标记
+    return MARGIN_RE.sub('', text.replace('——', '¨'))
+
+def count_chars(paths):
+    """
+    流式统计文本中各字符出现次数，—— 按排版时的方式计为一个破折号字图（¨），
+    左边距标记 <[N]> 不计入。
+
+    paths 中的 '-' 表示标准输入。
+    """
+    counts = Counter()
+    for path in paths:
+        f = sys.stdin if path == '-' else open(path, encoding='utf-8', errors='replace')
+        try:
+            carry = ''
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunk = carry + chunk
+                # 块末尾未结束的标记、连续的 —（可能与下一块开头组成 ——）留到下一块处理
+                partial = _PARTIAL_MARGIN_RE.search(chunk)
+                stripped = chunk[:partial.start()] if partial else chunk.rstrip('—')
+                carry = chunk[len(stripped):]
+                counts.update(_layout_text(stripped))
+            counts.update(_layout_text(carry))
+        finally:
+            if f is not sys.stdin:
+                f.close()
+    for char in SKIP_CHARS:
+        counts.pop(char, None)
+    return counts
+
+def coverage_report(counts, library, top=50):
+    """
+    计算覆盖率。
+
+    返回:
+    dict: total / covered（按出现次数）、distinct / distinct_covered（按字符种类）、
+          missing（[(字符, 次数)]，按次数降序）、
+          next_best（[(字符, 次数, 补写该字及之前所有字后的覆盖率)]，取前 top 个）、
+          thin（已有但只有一种写法、出现最多的字，补写变体可减少重复感）
+    """
+    total = sum(counts.values())
+    missing = sorted(((char, n) for char, n in counts.items() if char not in library), key=lambda item: (-item[1], item[0]))
+    covered = total - sum(n for _, n in missing)
+
+    next_best = []
+    running = covered
+    for char, n in missing[:top]:
+        running += n
+        next_best.append((char, n, running / total if total else 1.0))
+
+    thin = sorted(((char, n) for char, n in counts.items() if library.get(char) == 1), key=lambda item: (-item[1], item[0]))
+
+    return {
+        'total': total,
+        'covered': covered,
+        'coverage': covered / total if total else 1.0,
+        'distinct': len(counts),
+        'distinct_covered': len(counts) - len(missing),
+        'missing': missing,
+        'next_best': next_best,
+        'thin': thin[:top],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='统计文本的字库覆盖率和缺失字符')
+    parser.add_argument('inputs', nargs='+', help="文本文件（UTF-8），'-' 表示标准输入")
+    parser.add_argument('-g', '--glyphs', default='output_chars_ds', help='字库文件夹 (默认: output_chars_ds)')
+    parser.add_argument('-n', '--top', type=int, default=50, help='列出的建议补写字数 (默认: 50)')
+    parser.add_argument('-o', '--output', help='把建议补写的字按顺序写入该文件，可作为 rename.py 的文字')
+    parser.add_argument('--json', help='把完整结果写入 JSON 文件')
+    parser.add_argument('--index', default=INDEX_PATH, help=f'字库索引文件 (默认: {INDEX_PATH})')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    library = library_chars(args.glyphs, args.index)
+    counts = count_chars(args.inputs)
+    report = coverage_report(counts, library, args.top)
+    elapsed = time.perf_counter() - start
+
+    print(f"字库: {len(library)} 个字符；文本: {report['total']} 字，{report['distinct']} 种（{elapsed:.2f} s）")
+    print(f"覆盖率: {report['coverage']:.2%}（按出现次数），"
+          f"{report['distinct_covered']}/{report['distinct']}（按字符种类）")
+    print(f"缺失字符 {len(report['missing'])} 种，共出现 {report['total'] - report['covered']} 次")
+
+    if report['next_best']:
+        print(f"\n建议补写（前 {len(report['next_best'])} 个，右侧为补写到该字为止的覆盖率）:")
+        for char, n, cumulative in report['next_best']:
+            print(f"  {char}  {n:>7}  {cumulative:.2%}")
+    if report['thin']:
+        print('\n只有一种写法的常用字:')
+        print('  ' + ' '.join(f'{char}({n})' for char, n in report['thin']))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(''.join(char for char, _, _ in report['next_best']) + '\n')
+        print(f"\n已将建议补写的字写入 {args.output}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+if __name__ == '__main__':
+    main()
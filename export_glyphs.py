@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+导出发布用的精简字库：每张字图裁剪到非白像素的包围盒，灰度量化后用优化的 PNG 或无损 WebP 编码，
+并报告与原字库相比的体积和解码时间（多次解码取中位数）。
+
+glyph_pipeline.py 的输出保留了切图时的整个格子，且去噪后只剩白色和 0–162 之间的灰度，
+文件中大部分是白边；裁剪、量化后渲染时下载的数据少得多，需要解码的像素约为一半。
+解码时间的差别则小得多（PIL 下 16 色 PNG 与原字库基本持平），以导出时报告的实测为准。
+
+导出的 manifest.json 与原字库格式相同（版本 2，宽、高、墨迹包围盒仍为原字图坐标，排版结果不变），
+每项追加第 5 个元素——裁剪框 [左, 上, 右, 下]，文件中只保存该区域:
+    {"version": 2, "ink_threshold": 180, "encoding": {"mode": "palette", "colors": 16, "format": "png", ...},
+     "glyphs": {"字": [["字.png", 宽, 高, [左, 上, 右, 下], [左, 上, 右, 下]], ...], ...}}
+整张空白的字图裁剪框为 null，不写文件，文件名为 null。index.html、render.py、build_atlas.py
+按裁剪框把字图画回原来的位置，见 glyphs.glyph_metrics() 的 trim。
+
+量化方式:
+    palette  非白像素量化为 colors - 1 级灰度（每张字图按自身最深、最浅的灰度均分）加白色，
+             保存为调色板图，位深按色数取 1/2/4/8 位
+    1bit     灰度低于 ink_threshold 的为黑，其余为白，丢失抗锯齿
+    gray     不量化，只裁剪，与原字图逐像素一致
+
+示例:
+    python export_glyphs.py -i output_chars_ds -o published
+    python export_glyphs.py -o published-webp --format webp --mode 1bit --report export_report.json
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from glyphs import MANIFEST_NAME, MANIFEST_VERSION, build_manifest, ink_box, load_manifest
+
+MODES = ('palette', '1bit', 'gray')
+FORMATS = ('png', 'webp')
+
+def quantize(gray, mode='palette', colors=16, threshold=180):
+    """
+    量化字图灰度。
+
+    返回:
+    tuple: (量化后的灰度图, palette 模式下每个像素的调色板序号（其余模式为 None）, 调色板灰度列表)
+    """
+    if mode == 'gray':
+        return gray, None, None
+    if mode == '1bit':
+        return np.where(gray < threshold, 0, 255).astype(np.uint8), None, None
+
+    ink = gray < 255
+    if not ink.any():
+        return gray, np.zeros(gray.shape, np.uint8), [255]
+    low, high = int(gray[ink].min()), int(gray[ink].max())
+    levels = max(1, min(colors - 1, high - low + 1))
+    if levels == 1:
+        index = np.zeros(gray.shape, np.uint8)
+        palette = [low]
+    else:
+        # 非白像素四舍五入到最近的一级，白色单独占最后一个序号
+        step = (high - low) / (levels - 1)
+        index = np.rint((gray.astype(np.float32) - low) / step).clip(0, levels - 1).astype(np.uint8)
+        palette = [int(round(low + i * step)) for i in range(levels)]
+    index[~ink] = len(palette)
+    palette.append(255)
+    return np.asarray(palette, np.uint8)[index], index, palette
+
+def encode_glyph(gray, index=None, palette=None, mode='palette', fmt='png'):
+    """把（已裁剪的）字图编码为 PNG 或无损 WebP 字节。"""
+    if mode == '1bit':
+        img = Image.fromarray(gray >= 128)
+    elif mode == 'palette' and fmt == 'png':
+        img = Image.fromarray(index)
+        img.putpalette([value for level in palette for value in (level, level, level)])
+    else:
+        img = Image.fromarray(gray)
+
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        img.save(buffer, 'WEBP', lossless=True, quality=100, method=4)
+    elif img.mode == 'P':
+        bits = next(bits for bits in (1, 2, 4, 8) if len(palette) <= 1 << bits)
+        img.save(buffer, 'PNG', optimize=True, bits=bits)
+    else:
+        img.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+def decode_gray(data):
+    with Image.open(io.BytesIO(data)) as img:
+        return np.asarray(img.convert('L'))
+
+def _export_files(args):
+    """进程池任务：导出一批字图，返回 [(裁剪框, 输出文件名, 原大小, 新大小, 最大灰度误差), ...]。"""
+    input_dir, output_dir, filenames, mode, colors, fmt, threshold = args
+    results = []
+    for filename in filenames:
+        with open(os.path.join(input_dir, filename), 'rb') as f:
+            data = f.read()
+        gray = decode_gray(data)
+        quantized, index, palette = quantize(gray, mode, colors, threshold)
+        trim = ink_box(quantized, 255)
+        if trim is None:
+            results.append((None, None, len(data), 0, 0))
+            continue
+
+        left, top, right, bottom = trim
+        encoded = encode_glyph(quantized[top:bottom, left:right],
+                               None if index is None else index[top:bottom, left:right], palette, mode, fmt)
+        # 编码无损：解码、放回原位后应与量化结果完全一致
+        restored = np.full_like(gray, 255)
+        restored[top:bottom, left:right] = decode_gray(encoded)
+        if not np.array_equal(restored, quantized):
+            raise ValueError(f"编码结果与量化结果不一致: {filename}")
+
+        output_name = os.path.splitext(filename)[0] + '.' + fmt
+        with open(os.path.join(output_dir, output_name), 'wb') as f:
+            f.write(encoded)
+        error = int(np.abs(restored.astype(np.int16) - gray).max())
+        results.append((trim, output_name, len(data), len(encoded), error))
+    return results
+
+def _decode_files(folder, filenames):
+    start = time.perf_counter()
+    for filename in filenames:
+        with Image.open(os.path.join(folder, filename)) as img:
+            img.load()
+    return time.perf_counter() - start
+
+def decode_times(libraries, repeats=5):
+    """
+    单进程解码各字库的所有文件，重复 repeats 次，取中位数。各字库交替解码，机器负载的波动对它们的影响相同；
+    计时前先各读一遍以排除磁盘缓存的影响。
+
+    参数:
+    libraries (list): [(文件夹, 文件名列表), ...]
+
+    返回:
+    list: 各字库解码一遍用时（秒）的中位数
+    """
+    for folder, filenames in libraries:
+        _decode_files(folder, filenames)
+    times = [[] for _ in libraries]
+    for _ in range(repeats):
+        for (folder, filenames), library_times in zip(libraries, times):
+            library_times.append(_decode_files(folder, filenames))
+    return [statistics.median(library_times) for library_times in times]
+
+def _exported_files(folder):
+    """folder 中上次导出的字图文件名；不是导出结果的文件夹返回空集合。"""
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if 'encoding' not in manifest:
+        return set()
+    return {entry[0] for entries in manifest['glyphs'].values() for entry in entries if entry[0]}
+
+def export_library(input_dir, output_dir, mode='palette', colors=16, fmt='png', workers=None, batch_size=64,
+                   decode_repeats=5):
+    """
+    导出 input_dir 中的所有字图到 output_dir，写入带裁剪框的 manifest.json。
+    解码时间为原字库、导出结果各解码 decode_repeats 次的中位数。
+
+    返回:
+    dict: 体积、解码时间和量化误差的报告
+    """
+    if mode not in MODES:
+        raise ValueError(f"未知的量化方式: {mode}")
+    if fmt not in FORMATS:
+        raise ValueError(f"未知的格式: {fmt}")
+    if not 2 <= colors <= 256:
+        raise ValueError(f"色数须在 2–256 之间: {colors}")
+    if os.path.abspath(input_dir) == os.path.abspath(output_dir):
+        raise ValueError("输出文件夹不能与字库文件夹相同")
+    manifest = load_manifest(input_dir) or build_manifest(input_dir)
+    threshold = manifest['ink_threshold']
+    entries = [(char, entry) for char, char_entries in manifest['glyphs'].items() for entry in char_entries]
+    filenames = [entry[0] for _, entry in entries]
+
+    os.makedirs(output_dir, exist_ok=True)
+    previous = _exported_files(output_dir)
+    batches = [filenames[i:i + batch_size] for i in range(0, len(filenames), batch_size)]
+    tasks = [(input_dir, output_dir, batch, mode, colors, fmt, threshold) for batch in batches]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = [result for batch in executor.map(_export_files, tasks) for result in batch]
+    elapsed = time.perf_counter() - start
+
+    glyphs = {}
+    for (char, (_, width, height, ink, *_)), (trim, output_name, _, _, _) in zip(entries, results):
+        glyphs.setdefault(char, []).append([output_name, width, height, ink, trim])
+    encoding = {'mode': mode, 'colors': colors if mode == 'palette' else None, 'format': fmt,
+                'source': os.path.basename(os.path.normpath(input_dir))}
+    exported = {'version': MANIFEST_VERSION, 'ink_threshold': threshold, 'encoding': encoding, 'glyphs': glyphs}
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(exported, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+    # 删除上次导出留下、本次没有的字图（例如换了格式）
+    written_files = [result[1] for result in results if result[1]]
+    for name in previous - set(written_files):
+        if os.path.exists(os.path.join(output_dir, name)):
+            os.remove(os.path.join(output_dir, name))
+
+    input_decode, output_decode = decode_times([(input_dir, filenames), (output_dir, written_files)], decode_repeats)
+
+    return {
+        'input': input_dir,
+        'output': output_dir,
+        'encoding': encoding,
+        'glyphs': len(results),
+        'blank': sum(1 for result in results if result[0] is None),
+        'seconds': elapsed,
+        'input_bytes': sum(result[2] for result in results),
+        'output_bytes': sum(result[3] for result in results),
+        'input_pixels': sum(entry[1] * entry[2] for _, entry in entries),
+        'output_pixels': sum((trim[2] - trim[0]) * (trim[3] - trim[1]) for trim, *_ in results if trim),
+        'max_error': max((result[4] for result in results), default=0),
+        'decode_repeats': decode_repeats,
+        'input_decode_seconds': input_decode,
+        'output_decode_seconds': output_decode,
+    }
+
+def print_report(report):
+    def ratio(new, old):
+        return f"{new / old:.1%}" if old else '-'
+
+    encoding = report['encoding']
+    name = encoding['mode'] + (f" {encoding['colors']} 色" if encoding['colors'] else '') + f"，{encoding['format']}"
+    print(f"已导出 {report['glyphs']} 张字图（{name}）至 {report['output']}，用时 {report['seconds']:.2f} s；"
+          f"空白 {report['blank']} 张，最大灰度误差 {report['max_error']}")
+    print(f"{'':<8} {'原字库':>12} {'导出':>12} {'比例':>8}")
+    print(f"{'体积':<8} {report['input_bytes'] / 1024 / 1024:>10.2f}MB {report['output_bytes'] / 1024 / 1024:>10.2f}MB "
+          f"{ratio(report['output_bytes'], report['input_bytes']):>8}")
+    print(f"{'像素':<8} {report['input_pixels'] / 1e6:>10.2f}M  {report['output_pixels'] / 1e6:>10.2f}M  "
+          f"{ratio(report['output_pixels'], report['input_pixels']):>8}")
+    print(f"{'解码':<8} {report['input_decode_seconds'] * 1000:>10.0f}ms {report['output_decode_seconds'] * 1000:>10.0f}ms "
+          f"{ratio(report['output_decode_seconds'], report['input_decode_seconds']):>8}  "
+          f"（PIL 单进程，交替解码 {report['decode_repeats']} 次的中位数）")
+
+def main():
+    parser = argparse.ArgumentParser(description='导出裁剪、量化后的发布用字库，报告体积和解码时间')
+    parser.add_argument('-i', '--input', default='output_chars_ds', help='字库文件夹路径 (默认: output_chars_ds)')
+    parser.add_argument('-o', '--output', default='published', help='输出文件夹路径 (默认: published)')
+    parser.add_argument('-m', '--mode', choices=MODES, default='palette', help='量化方式 (默认: palette)')
+    parser.add_argument('-c', '--colors', type=int, default=16, help='palette 模式的色数，含白色 (默认: 16)')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='png', help='编码格式 (默认: png)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='进程数 (默认: CPU 核数)')
+    parser.add_argument('--repeats', type=int, default=5, help='测量解码时间的重复次数，取中位数 (默认: 5)')
+    parser.add_argument('--report', help='把报告写入 JSON 文件')
+    args = parser.parse_args()
+
+    report = export_library(args.input, args.output, args.mode, args.colors, args.format, args.workers,
+                            decode_repeats=args.repeats)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+
+if __name__ == '__main__':
+    main()
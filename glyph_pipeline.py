@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+字库清理流水线：一次解码，在内存中完成居中、去噪和对比度调整，一次编码。
+
+结果与 center.py → noise_ds.py 两步处理（中间经 output_chars 落盘）逐像素一致，
+可用 --verify 对比。
+
+示例:
+    python glyph_pipeline.py -i handwriting_chars -o output_chars_ds
+    python glyph_pipeline.py --verify
+"""
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from center import contains_chinese
+from glyphs import build_manifest
+
+STAGES = ['read', 'decode', 'center', 'denoise', 'encode', 'write']
+
+# 每个进程复用的输出缓冲区，按需增长
+_buffer = np.empty(0, np.uint8)
+
+def denoise_lut(threshold=180, contrast_factor=0.9):
+    """
+    构造与 noise_ds.remove_noise 等价的 256 项查找表。
+
+    remove_noise 对每个像素: 灰度高于 threshold 的视为噪点置白，
+    其余取 convertScaleAbs(gray, alpha=contrast_factor)，结果只取决于像素自身的灰度值。
+    """
+    values = np.arange(256, dtype=np.uint8).reshape(1, -1)
+    lut = cv2.convertScaleAbs(values, alpha=contrast_factor, beta=0)
+    lut[values > threshold] = 255
+    return lut
+
+def ink_rows(luma, threshold=180):
+    """返回包含深于 threshold 像素的首末行，全白时返回整个高度，与 center.find_non_white_region 一致。"""
+    rows = np.flatnonzero((luma < threshold).any(axis=1))
+    if rows.size == 0:
+        return 0, luma.shape[0] - 1
+    return int(rows[0]), int(rows[-1])
+
+def _output_buffer(height, width):
+    """取一块 height × width 的连续缓冲区视图，避免每张字图重新分配。"""
+    global _buffer
+    if _buffer.size < height * width:
+        _buffer = np.empty(height * width, np.uint8)
+    return _buffer[:height * width].reshape(height, width)
+
+def compose_glyph(gray, top, bottom, lut, out=None):
+    """
+    将 gray[top:bottom+1] 竖直居中到白底上，并按查找表去噪。
+
+    居中与逐像素查找表可交换，直接在灰度上完成，与先生成 RGB 居中图再去噪的结果一致。
+    """
+    height, width = gray.shape
+    if out is None:
+        out = np.empty((height, width), np.uint8)
+    content_height = bottom - top + 1
+    y_offset = max(0, (height - content_height) // 2)
+    # 居中后的空白背景为纯白，经查找表后为 lut[255]
+    out.fill(lut[0, 255])
+    cv2.LUT(gray[top:bottom + 1], lut, dst=out[y_offset:y_offset + content_height])
+    return out
+
+def process_glyph(data, filename, lut, center_threshold=180, timings=None):
+    """
+    处理一张字图的原始文件字节，返回编码后的 PNG 字节；无法解码时返回 None。
+
+    中文文件名的字图按 center.py 的方式（PIL 解码）居中，其余只去噪（与 center.py 直接复制后由
+    noise_ds.py 用 OpenCV 读取一致）。timings 为字典时累加各阶段耗时。
+    """
+    timings = timings if timings is not None else {}
+    start = time.perf_counter()
+
+    if contains_chinese(filename):
+        with Image.open(io.BytesIO(data)) as img:
+            rgb = img.convert('RGB') if img.mode != 'RGB' else img.copy()
+        luma = np.asarray(rgb.convert('L'))
+        rgb = np.asarray(rgb)
+        gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        t_decode = time.perf_counter()
+        top, bottom = ink_rows(luma, center_threshold)
+    else:
+        bgr = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if bgr is None:
+            return None
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        t_decode = time.perf_counter()
+        # 不居中：内容保持原位
+        top, bottom = 0, gray.shape[0] - 1
+    t_center = time.perf_counter()
+
+    out = compose_glyph(gray, top, bottom, lut, _output_buffer(*gray.shape))
+    t_denoise = time.perf_counter()
+
+    encoded = cv2.imencode('.png', out)[1].tobytes()
+    t_encode = time.perf_counter()
+
+    for stage, elapsed in [('decode', t_decode - start), ('center', t_center - t_decode),
+                           ('denoise', t_denoise - t_center), ('encode', t_encode - t_denoise)]:
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+    return encoded
+
+def _process_files(args):
+    """进程池任务：处理一批文件，返回 (失败文件列表, 各阶段耗时)。"""
+    input_dir, output_dir, filenames, threshold, contrast_factor, center_threshold = args
+    lut = denoise_lut(threshold, contrast_factor)
+    timings = dict.fromkeys(STAGES, 0.0)
+    failed = []
+    for filename in filenames:
+        start = time.perf_counter()
+        with open(os.path.join(input_dir, filename), 'rb') as f:
+            data = f.read()
+        timings['read'] += time.perf_counter() - start
+
+        try:
+            encoded = process_glyph(data, filename, lut, center_threshold, timings)
+        except Exception as e:
+            print(f"处理 {filename} 时出错: {e}")
+            encoded = None
+        if encoded is None:
+            failed.append(filename)
+            continue
+
+        start = time.perf_counter()
+        with open(os.path.join(output_dir, filename), 'wb') as f:
+            f.write(encoded)
+        timings['write'] += time.perf_counter() - start
+    return failed, timings
+
+def run_pipeline(input_dir, output_dir, threshold=180, contrast_factor=0.9, center_threshold=180, workers=None, batch_size=64):
+    """
+    处理 input_dir 中的所有 PNG 字图，写入 output_dir。
+
+    返回:
+    dict: 各阶段累计耗时（秒，多进程时为各进程之和）与总耗时 'wall'。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    filenames = sorted(f for f in os.listdir(input_dir) if f.lower().endswith('.png'))
+    batches = [filenames[i:i + batch_size] for i in range(0, len(filenames), batch_size)]
+    tasks = [(input_dir, output_dir, batch, threshold, contrast_factor, center_threshold) for batch in batches]
+
+    print(f"开始处理 {len(filenames)} 张图片...")
+    print(f"参数设置: 居中阈值={center_threshold}, 噪点阈值={threshold}, 对比度增强={contrast_factor}")
+
+    start = time.perf_counter()
+    totals = dict.fromkeys(STAGES, 0.0)
+    failed = []
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch, (batch_failed, timings) in zip(batches, executor.map(_process_files, tasks)):
+            failed.extend(batch_failed)
+            for stage in STAGES:
+                totals[stage] += timings[stage]
+            done += len(batch)
+            print(f"处理进度: {done}/{len(filenames)}")
+    totals['wall'] = time.perf_counter() - start
+
+    # 更新字库清单，供渲染时查表
+    build_manifest(output_dir)
+
+    if failed:
+        print(f"无法处理 {len(failed)} 张图片: {' '.join(failed)}")
+    print(f"\n处理完成！结果已保存至 {output_dir}")
+    print("各阶段耗时（各进程合计）:")
+    for stage in STAGES:
+        print(f"  {stage:<8} {totals[stage]:8.3f} s")
+    print(f"  {'总耗时':<6} {totals['wall']:8.3f} s")
+    return totals
+
+def verify(input_dir, threshold=180, contrast_factor=0.9, center_threshold=180, workers=None):
+    """
+    分别用 center.py → noise_ds.py 旧流程和本流水线处理 input_dir，逐像素比较输出。
+
+    返回:
+    bool: 所有文件均一致时为 True。
+    """
+    from center import process_images
+    from noise_ds import batch_denoise
+
+    tmp = tempfile.mkdtemp(prefix='glyph_pipeline_')
+    try:
+        centered_dir = os.path.join(tmp, 'output_chars')
+        legacy_dir = os.path.join(tmp, 'output_chars_ds')
+        fused_dir = os.path.join(tmp, 'fused')
+
+        start = time.perf_counter()
+        process_images(input_dir, centered_dir, center_threshold, workers, force=True)
+        batch_denoise(centered_dir, legacy_dir, threshold, contrast_factor)
+        legacy_time = time.perf_counter() - start
+
+        fused_time = run_pipeline(input_dir, fused_dir, threshold, contrast_factor, center_threshold, workers)['wall']
+
+        legacy_files = sorted(f for f in os.listdir(legacy_dir) if f.lower().endswith('.png'))
+        fused_files = sorted(f for f in os.listdir(fused_dir) if f.lower().endswith('.png'))
+        mismatched = [f for f in legacy_files if f not in fused_files] + [f for f in fused_files if f not in legacy_files]
+        for filename in legacy_files:
+            if filename not in fused_files:
+                continue
+            expected = cv2.imread(os.path.join(legacy_dir, filename), cv2.IMREAD_UNCHANGED)
+            actual = cv2.imread(os.path.join(fused_dir, filename), cv2.IMREAD_UNCHANGED)
+            if expected.shape != actual.shape or not np.array_equal(expected, actual):
+                mismatched.append(filename)
+
+        print(f"\n旧流程 {legacy_time:.2f} s，流水线 {fused_time:.2f} s；"
+              f"共比较 {len(legacy_files)} 张，不一致 {len(mismatched)} 张。")
+        for filename in mismatched[:20]:
+            print(f"  不一致: {filename}")
+        return not mismatched
+    finally:
+        shutil.rmtree(tmp)
+
+def main():
+    parser = argparse.ArgumentParser(description='字库清理流水线（居中 + 去噪 + 对比度调整）')
+    parser.add_argument('-i', '--input', default='handwriting_chars', help='输入文件夹路径 (默认: handwriting_chars)')
+    parser.add_argument('-o', '--output', default='output_chars_ds', help='输出文件夹路径 (默认: output_chars_ds)')
+    parser.add_argument('--center-threshold', type=int, default=180, help='居中时的非空白像素阈值 (默认: 180)')
+    parser.add_argument('-t', '--threshold', type=int, default=180, help='噪点阈值 (0-255, 默认: 180)')
+    parser.add_argument('-c', '--contrast', type=float, default=0.9, help='对比度增强因子 (默认: 0.9)')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='进程数 (默认: CPU 核数)')
+    parser.add_argument('--verify', action='store_true', help='与 center.py → noise_ds.py 旧流程的输出逐像素比较')
+    args = parser.parse_args()
+
+    if args.verify:
+        if not verify(args.input, args.threshold, args.contrast, args.center_threshold, args.workers):
+            raise SystemExit(1)
+        return
+
+    run_pipeline(args.input, args.output, args.threshold, args.contrast, args.center_threshold, args.workers)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+把字库打包成单个文件 glyphs.bin，用 numpy.memmap 打开，按字直接取出字图位图，
+不必遍历文件夹、逐个解码 PNG。多个进程打开同一文件时共享操作系统的页缓存。
+
+文件格式（小端）:
+    头部 32 字节: 魔数 b'PHZGLYPH', 格式版本 uint32, 位深 uint32 (8 或 1),
+                  索引长度 uint64, 位图区偏移 uint64
+    索引: UTF-8 JSON，与 manifest.json 相同，每项末尾追加位图在位图区中的偏移:
+        {"version": 1, "source": "output_chars_ds", "ink_threshold": 180, "bits": 8,
+         "manifest": [manifest.json 的 mtime_ns, 字节数],
+         "glyphs": {"字": [["字.png", 宽, 高, [左, 上, 右, 下], 偏移], ...], ...}}
+    位图区（按 64 字节对齐）: 各字图依次排列。8 位时为逐行的灰度 uint8（宽 × 高 字节），
+        与 PNG 解码结果完全一致；1 位时按行用 np.packbits 打包（每行 ceil(宽/8) 字节），
+        1 为墨迹（灰度低于 ink_threshold），体积约为 8 位的 1/8，但丢失灰度。
+
+字库有变化（写入新字、重新生成 manifest.json）后需重新打包；open_store() 发现
+manifest.json 与打包时不同时返回 None，调用方退回逐个读取 PNG。
+
+示例:
+    python glyph_store.py -i output_chars_ds             # 生成 output_chars_ds/glyphs.bin
+    python glyph_store.py -i output_chars_ds --bits 1 -o glyphs-1bit.bin
+    python glyph_store.py -i output_chars_ds --check     # 与 PNG 逐像素比对
+"""
+import argparse
+import json
+import os
+import struct
+import time
+
+import cv2
+import numpy as np
+
+from glyphs import MANIFEST_NAME, build_manifest, load_manifest
+
+STORE_NAME = 'glyphs.bin'
+STORE_MAGIC = b'PHZGLYPH'
+STORE_VERSION = 1
+_HEADER = struct.Struct('<8sIIQQ')
+_ALIGN = 64
+
+def _manifest_stamp(folder):
+    """manifest.json 的 [mtime_ns, 字节数]，用于判断打包文件是否过期。"""
+    stat = os.stat(os.path.join(folder, MANIFEST_NAME))
+    return [stat.st_mtime_ns, stat.st_size]
+
+def _bitmap_size(width, height, bits):
+    return height * ((width + 7) // 8) if bits == 1 else width * height
+
+def build_store(folder, path=None, bits=8):
+    """
+    按 manifest.json（不存在或过旧时重新生成）把字库中的所有字图写入 path（默认 folder/glyphs.bin）。
+
+    返回:
+    dict: 索引（不含位图）
+    """
+    if bits not in (8, 1):
+        raise ValueError(f"位深只能为 8 或 1: {bits}")
+    path = path or os.path.join(folder, STORE_NAME)
+    manifest = load_manifest(folder) or build_manifest(folder)
+    threshold = manifest['ink_threshold']
+
+    index = {'version': STORE_VERSION, 'source': os.path.basename(os.path.normpath(folder)),
+             'ink_threshold': threshold, 'bits': bits, 'manifest': _manifest_stamp(folder), 'glyphs': {}}
+    bitmaps = []
+    offset = 0
+    for char, entries in manifest['glyphs'].items():
+        stored = []
+        for entry in entries:
+            if len(entry) > 4:
+                raise ValueError(f"{folder} 是 export_glyphs.py 导出的裁剪字库，请打包原字库")
+            filename, width, height, ink = entry
+            gray = cv2.imdecode(np.fromfile(os.path.join(folder, filename), np.uint8), cv2.IMREAD_GRAYSCALE)
+            if gray is None or gray.shape != (height, width):
+                raise ValueError(f"字图与 {MANIFEST_NAME} 不一致，请先运行 python glyphs.py -i {folder}: {filename}")
+            bitmap = np.packbits(gray < threshold, axis=1) if bits == 1 else gray
+            bitmaps.append(bitmap)
+            stored.append([filename, width, height, ink, offset])
+            offset += bitmap.nbytes
+        index['glyphs'][char] = stored
+
+    index_bytes = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    data_offset = -(-(_HEADER.size + len(index_bytes)) // _ALIGN) * _ALIGN
+    with open(path + '.tmp', 'wb') as f:
+        f.write(_HEADER.pack(STORE_MAGIC, STORE_VERSION, bits, len(index_bytes), data_offset))
+        f.write(index_bytes)
+        f.write(b'\0' * (data_offset - _HEADER.size - len(index_bytes)))
+        for bitmap in bitmaps:
+            f.write(np.ascontiguousarray(bitmap).tobytes())
+    os.replace(path + '.tmp', path)
+    return index
+
+class GlyphStore:
+    """
+    只读打开 glyphs.bin。索引在打开时读入内存，位图区为 numpy.memmap，
+    get() 返回的 8 位字图是映射区域上的只读视图，用到时才从磁盘读入。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, bits, index_length, data_offset = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != STORE_MAGIC:
+                raise ValueError(f"不是字库打包文件: {path}")
+            if version != STORE_VERSION:
+                raise ValueError(f"{path} 格式版本为 {version}，当前为 {STORE_VERSION}，请重新生成")
+            index = json.loads(f.read(index_length).decode('utf-8'))
+        self.bits = bits
+        self.ink_threshold = index['ink_threshold']
+        self.source = index['source']
+        self.manifest_stamp = index['manifest']
+        self._glyphs = index['glyphs']
+        self._files = {entry[0]: (char, variant) for char, entries in self._glyphs.items()
+                       for variant, entry in enumerate(entries)}
+        # 空字库时 memmap 无法映射长度为 0 的区域
+        if os.path.getsize(path) > data_offset:
+            self._data = np.memmap(path, np.uint8, 'r', offset=data_offset)
+        else:
+            self._data = np.zeros(0, np.uint8)
+
+    def __contains__(self, char):
+        return char in self._glyphs
+
+    def __len__(self):
+        return len(self._files)
+
+    def chars(self):
+        return list(self._glyphs)
+
+    def variant_count(self, char):
+        return len(self._glyphs.get(char, ()))
+
+    def entries(self, char):
+        """与 manifest.json 相同的 [文件名, 宽, 高, 墨迹包围盒] 列表，可交给 glyphs.glyph_metrics()。"""
+        return [entry[:4] for entry in self._glyphs.get(char, ())]
+
+    def manifest(self):
+        """与 glyphs.load_manifest() 返回值格式相同的清单。"""
+        return {'version': 2, 'ink_threshold': self.ink_threshold,
+                'glyphs': {char: self.entries(char) for char in self._glyphs}}
+
+    def size(self, char, variant=0):
+        """返回字图的 (宽, 高)，缺字返回 None。"""
+        if char not in self._glyphs:
+            return None
+        _, width, height, _, _ = self._glyphs[char][variant]
+        return width, height
+
+    def get(self, char, variant=0):
+        """
+        返回字图的灰度数组（高 × 宽，uint8），缺字返回 None。
+
+        8 位时为不复制的只读视图；1 位时解包为新数组，墨迹为 0，其余为 255。
+        """
+        if char not in self._glyphs:
+            return None
+        _, width, height, _, offset = self._glyphs[char][variant]
+        data = self._data[offset:offset + _bitmap_size(width, height, self.bits)]
+        if self.bits == 8:
+            return data.reshape(height, width)
+        ink = np.unpackbits(data.reshape(height, -1), axis=1, count=width)
+        return (1 - ink) * np.uint8(255)
+
+    def get_file(self, filename):
+        """按字库中的文件名取字图，不存在时返回 None。"""
+        if filename not in self._files:
+            return None
+        return self.get(*self._files[filename])
+
+    def items(self):
+        """依次返回 (字符, 变体序号, 文件名, 字图)。"""
+        for char, entries in self._glyphs.items():
+            for variant, entry in enumerate(entries):
+                yield char, variant, entry[0], self.get(char, variant)
+
+def open_store(folder, path=None):
+    """
+    打开字库的打包文件；文件不存在、格式版本不同，或 manifest.json 在打包后有变化
+    （写入了新字、重新生成了清单）时返回 None。
+    """
+    path = path or os.path.join(folder, STORE_NAME)
+    if not os.path.exists(path) or not os.path.exists(os.path.join(folder, MANIFEST_NAME)):
+        return None
+    try:
+        store = GlyphStore(path)
+    except ValueError as e:
+        print(e)
+        return None
+    if store.manifest_stamp != _manifest_stamp(folder):
+        return None
+    return store
+
+def check_store(folder, store):
+    """把打包文件中的每张字图与 PNG 解码结果比对，返回不一致的文件名列表。"""
+    mismatched = []
+    for _, _, filename, bitmap in store.items():
+        gray = cv2.imdecode(np.fromfile(os.path.join(folder, filename), np.uint8), cv2.IMREAD_GRAYSCALE)
+        if store.bits == 1 and gray is not None:
+            gray = np.where(gray < store.ink_threshold, 0, 255).astype(np.uint8)
+        if gray is None or not np.array_equal(gray, bitmap):
+            mismatched.append(filename)
+    return mismatched
+
+def main():
+    parser = argparse.ArgumentParser(description='把字库打包为可用 numpy.memmap 打开的单个文件')
+    parser.add_argument('-i', '--input', default='output_chars_ds', help='字库文件夹路径 (默认: output_chars_ds)')
+    parser.add_argument('-o', '--output', help=f'打包文件路径 (默认: <input>/{STORE_NAME})')
+    parser.add_argument('--bits', type=int, choices=(8, 1), default=8, help='位深：8 为原样灰度，1 为按墨迹阈值二值化 (默认: 8)')
+    parser.add_argument('--check', action='store_true', help='不重新打包，把已有的打包文件与 PNG 逐像素比对')
+    args = parser.parse_args()
+    path = args.output or os.path.join(args.input, STORE_NAME)
+
+    if not args.check:
+        start = time.perf_counter()
+        build_store(args.input, path, args.bits)
+        print(f"已打包至 {path}（{os.path.getsize(path) / 1024 / 1024:.1f} MB），用时 {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    store = GlyphStore(path)
+    print(f"打开 {path}: {len(store)} 张字图，{len(store.chars())} 个字符，{(time.perf_counter() - start) * 1000:.1f} ms")
+    if args.check:
+        mismatched = check_store(args.input, store)
+        print(f"共比对 {len(store)} 张，不一致 {len(mismatched)} 张。" + (' ' + ' '.join(mismatched[:20]) if mismatched else ''))
+        if mismatched:
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
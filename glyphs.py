@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+字图文件命名规则，与 index.html 中 loadCharImage 的查找方式一致。
+
+- 大写字母 A-Z 保存为 +cA.png，以区分大小写不敏感文件系统上的小写字母
+- 文件名中不能使用或容易混淆的符号使用别名，见 SPECIAL_NAMES
+- 同一字的其他写法保存为 字-2.png 或 字 2.png
+
+字库清单 manifest.json（python glyphs.py 生成）记录每个字的所有变体及其度量，
+渲染时直接查表，不必逐个请求文件来判断是否缺字，排版也不必先解码字图:
+    {"version": 2, "ink_threshold": 180,
+     "glyphs": {"字": [["字.png", 宽, 高, [左, 上, 右, 下]], ["字-1.png", ...], ...], ...}}
+第 4 项为墨迹包围盒（右、下不含），没有墨迹时为 null。宽高比为 宽/高，
+左右留白（bearing）分别为 左 和 宽-右，见 glyph_metrics()。
+export_glyphs.py 导出的精简字库每项另有第 5 项裁剪框 [左, 上, 右, 下]：文件中只保存字图的该区域，
+绘制时按裁剪框放回 宽 × 高 的格子中；整张空白时裁剪框和文件名均为 null。
+"""
+import argparse
+import json
+import os
+import re
+
+import cv2
+import numpy as np
+
+# 字符 -> 文件名（不含扩展名）
+SPECIAL_NAMES = {
+    '¨': '_pozhe',  # 破折号，排版前 —— 替换为 ¨
+    '#': '_hash',
+    '?': '_quest',
+    '/': '_slash',
+    ':': '_colon',
+    '.': 'dot',
+}
+SPECIAL_CHARS = {stem: char for char, stem in SPECIAL_NAMES.items()}
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 2
+# 灰度低于该值的像素视为墨迹，与 center.py 的默认阈值一致
+INK_THRESHOLD = 180
+
+_VARIANT_RE = re.compile(r'^(.+?)[- ](\d+)$')
+
+def glyph_stem(char):
+    """字符对应的字图文件名（不含扩展名）。"""
+    if char in SPECIAL_NAMES:
+        return SPECIAL_NAMES[char]
+    if 'A' <= char <= 'Z':
+        return f'+c{char}'
+    return char
+
+def parse_glyph_name(filename):
+    """
+    解析字图文件名。
+
+    返回:
+    tuple: (字符, 变体序号)，无后缀的文件序号为 0；不是 PNG 时返回 None
+    """
+    stem, ext = os.path.splitext(filename)
+    if ext.lower() != '.png':
+        return None
+    variant = 0
+    match = _VARIANT_RE.match(stem)
+    if match:
+        stem, variant = match.group(1), int(match.group(2))
+    if stem in SPECIAL_CHARS:
+        return SPECIAL_CHARS[stem], variant
+    if stem.startswith('+c') and len(stem) > 2:
+        stem = stem[2:]
+    return stem, variant
+
+def scan_glyphs(folder):
+    """
+    扫描字库文件夹。
+
+    返回:
+    dict: 字符 -> 文件名列表，按变体序号排列（无后缀的文件在前）
+    """
+    found = {}
+    for filename in os.listdir(folder):
+        parsed = parse_glyph_name(filename)
+        if parsed is None:
+            continue
+        char, variant = parsed
+        found.setdefault(char, []).append((variant, filename))
+    return {char: [filename for _, filename in sorted(entries)] for char, entries in sorted(found.items())}
+
+def ink_box(gray, threshold=INK_THRESHOLD):
+    """墨迹包围盒 [左, 上, 右, 下]（右、下不含），没有墨迹时返回 None。"""
+    ink = gray < threshold
+    cols = np.flatnonzero(ink.any(axis=0))
+    if cols.size == 0:
+        return None
+    rows = np.flatnonzero(ink.any(axis=1))
+    return [int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1]
+
+def glyph_metrics(entry):
+    """
+    由清单中的一项计算度量。
+
+    返回:
+    dict: file, width, height, aspect（宽/高）, ink（包围盒或 None）,
+          left_bearing / right_bearing（墨迹左右两侧的空白像素数，没有墨迹时为整个宽度）,
+          trim（文件中保存的区域；未裁剪时为整个字图，空白字图为 None）
+    """
+    filename, width, height, ink = entry[:4]
+    return {
+        'file': filename,
+        'width': width,
+        'height': height,
+        'aspect': width / height,
+        'ink': ink,
+        'left_bearing': ink[0] if ink else width,
+        'right_bearing': width - ink[2] if ink else width,
+        'trim': entry[4] if len(entry) > 4 else [0, 0, width, height],
+    }
+
+def build_manifest(folder, threshold=INK_THRESHOLD):
+    """扫描字库，计算每张字图的尺寸和墨迹包围盒，写入 folder/manifest.json 并返回清单。"""
+    glyphs = {}
+    for char, filenames in scan_glyphs(folder).items():
+        entries = []
+        for filename in filenames:
+            gray = cv2.imdecode(np.fromfile(os.path.join(folder, filename), np.uint8), cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                print(f"无法读取字图，已跳过: {filename}")
+                continue
+            height, width = gray.shape
+            entries.append([filename, width, height, ink_box(gray, threshold)])
+        if entries:
+            glyphs[char] = entries
+    manifest = {'version': MANIFEST_VERSION, 'ink_threshold': threshold, 'glyphs': glyphs}
+    _write_manifest(folder, manifest)
+    return manifest
+
+def update_manifest(folder, entries, threshold=INK_THRESHOLD):
+    """
+    把新写入字库的字图加入 folder/manifest.json，不重新解码已有的字图；
+    清单不存在、版本过旧或墨迹阈值不同时整个重新生成。
+
+    参数:
+    entries (list): 清单项 [文件名, 宽, 高, 墨迹包围盒]（包围盒按 threshold 计算），
+        同名文件已在清单中时替换该项。
+
+    返回:
+    dict: 更新后的清单
+    """
+    manifest = load_manifest(folder)
+    if manifest is None or manifest['ink_threshold'] != threshold:
+        return build_manifest(folder, threshold)
+
+    glyphs = manifest['glyphs']
+    for entry in entries:
+        parsed = parse_glyph_name(entry[0])
+        if parsed is None:
+            continue
+        char_entries = [old for old in glyphs.get(parsed[0], []) if old[0] != entry[0]]
+        char_entries.append(list(entry))
+        # 与 scan_glyphs 相同：按变体序号排列，无后缀的文件在前
+        char_entries.sort(key=lambda entry: (parse_glyph_name(entry[0])[1], entry[0]))
+        glyphs[parsed[0]] = char_entries
+    manifest['glyphs'] = dict(sorted(glyphs.items()))
+    _write_manifest(folder, manifest)
+    return manifest
+
+def _write_manifest(folder, manifest):
+    path = os.path.join(folder, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+def load_manifest(folder):
+    """读取 folder/manifest.json，不存在或版本过旧时返回 None。"""
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != MANIFEST_VERSION:
+        print(f"{path} 版本过旧，请运行 python glyphs.py -i {folder} 重新生成")
+        return None
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description='生成字库清单 manifest.json（变体、尺寸、墨迹包围盒）')
+    parser.add_argument('-i', '--input', default='output_chars_ds', help='字库文件夹路径 (默认: output_chars_ds)')
+    parser.add_argument('-t', '--threshold', type=int, default=INK_THRESHOLD, help=f'墨迹阈值 (0-255, 默认: {INK_THRESHOLD})')
+    args = parser.parse_args()
+
+    manifest = build_manifest(args.input, args.threshold)
+    files = sum(len(entries) for entries in manifest['glyphs'].values())
+    print(f"已写入 {os.path.join(args.input, MANIFEST_NAME)}：{len(manifest['glyphs'])} 个字符，{files} 张字图")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+auto_segment.py 的压测脚本。
+
+依次以不同的计算进程数启动分割服务，用多个并发客户端反复提交整页分割请求
+（/segment_page，二进制上传），统计吞吐量、延迟和 429 次数，
+用来确认吞吐量随进程数（CPU 核数）增长。
+
+示例:
+    python loadtest_segment.py --workers 1 2 4 --requests 200 --concurrency 16
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+from segment_regression import compose_page
+
+LINE_COUNT = 25
+LINE_HEIGHT = 70
+MARGIN = 100
+# 收到 429 后的重试间隔（秒）
+RETRY_DELAY = 0.02
+
+def make_pages(glyph_dir, count, width):
+    """用字图拼出若干张不同的示例页面，返回 PNG 字节列表。"""
+    pages = []
+    for seed in range(count):
+        page, _ = compose_page(glyph_dir, seed, width, LINE_COUNT, LINE_HEIGHT, MARGIN)
+        pages.append(cv2.imencode('.png', page)[1].tobytes())
+    return pages
+
+def post_page(url, page, retries=0):
+    """
+    提交一次整页分割请求，收到 429 时稍后重试，最多 retries 次。
+    连接被拒绝或被重置时不重试，记为失败（状态码 0）。
+
+    返回:
+    tuple: (最终 HTTP 状态码, 含重试的总耗时秒数, 429 次数)
+    """
+    query = f"top_y={MARGIN}&bottom_y={MARGIN + LINE_HEIGHT * (LINE_COUNT + 1)}&line_count={LINE_COUNT}"
+    start = time.perf_counter()
+    busy = 0
+    while True:
+        req = urllib.request.Request(f"{url}/segment_page?{query}", data=page,
+                                     headers={'Content-Type': 'application/octet-stream'})
+        try:
+            with urllib.request.urlopen(req) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except (urllib.error.URLError, ConnectionError):
+            status = 0
+        if status != 429 or busy >= retries:
+            return status, time.perf_counter() - start, busy
+        busy += 1
+        time.sleep(RETRY_DELAY)
+
+def wait_ready(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/cache_stats") as response:
+                return json.loads(response.read())
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError(f"服务在 {timeout} 秒内未就绪: {url}")
+
+def run_round(url, pages, requests, concurrency, retries):
+    # 预热：每张页面先请求一次，使解码结果进入缓存
+    for page in pages:
+        post_page(url, page, retries)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda i: post_page(url, pages[i % len(pages)], retries), range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(t for status, t, _ in results if status == 200)
+    ok = len(latencies)
+    return {
+        'ok': ok,
+        'busy': sum(busy for _, _, busy in results),
+        'failed': sum(1 for status, _, _ in results if status != 200),
+        'throughput': ok / elapsed,
+        'p50': latencies[ok // 2] if ok else float('nan'),
+        'p95': latencies[min(ok - 1, int(ok * 0.95))] if ok else float('nan'),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='自动分割服务压测')
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='依次测试的计算进程数 (默认: 1, 2, 4 … 直到 CPU 核数)')
+    parser.add_argument('--requests', type=int, default=200, help='每轮请求数 (默认: 200)')
+    parser.add_argument('--concurrency', type=int, default=16, help='并发客户端数 (默认: 16)')
+    parser.add_argument('--max-pending', type=int, default=None, help='传给服务的 --max-pending')
+    parser.add_argument('--retries', type=int, default=100, help='单个请求收到 429 后的最大重试次数 (默认: 100)')
+    parser.add_argument('--pages', type=int, default=4, help='示例页面数 (默认: 4)')
+    parser.add_argument('--width', type=int, default=1600, help='示例页面宽度 (默认: 1600)')
+    parser.add_argument('-g', '--glyphs', default='handwriting_chars', help='用于拼页的字图文件夹')
+    parser.add_argument('--port', type=int, default=5099, help='压测服务端口 (默认: 5099)')
+    args = parser.parse_args()
+
+    workers_list = args.workers
+    if workers_list is None:
+        cores = os.cpu_count() or 1
+        workers_list = [1]
+        while workers_list[-1] * 2 <= cores:
+            workers_list.append(workers_list[-1] * 2)
+        if workers_list[-1] != cores:
+            workers_list.append(cores)
+
+    print(f"正在生成 {args.pages} 张示例页面...")
+    pages = make_pages(args.glyphs, args.pages, args.width)
+    url = f"http://127.0.0.1:{args.port}"
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'auto_segment.py')
+
+    print(f"{'进程数':>6} {'成功':>6} {'429次':>6} {'失败':>6} {'请求/秒':>9} {'p50(ms)':>9} {'p95(ms)':>9}")
+    for workers in workers_list:
+        command = [sys.executable, script, '--host', '127.0.0.1', '--port', str(args.port), '--workers', str(workers)]
+        if args.max_pending is not None:
+            command += ['--max-pending', str(args.max_pending)]
+        server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_ready(url)
+            result = run_round(url, pages, args.requests, args.concurrency, args.retries)
+        finally:
+            server.terminate()
+            server.wait()
+        print(f"{workers:>6} {result['ok']:>6} {result['busy']:>6} {result['failed']:>6} "
+              f"{result['throughput']:>9.1f} {result['p50'] * 1000:>9.1f} {result['p95'] * 1000:>9.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,16 @@
 import os
 import re
+import sys
+import json
 import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
+import numpy as np
+
+from glyphs import glyph_stem
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
 
 def custom_sort_key(filename):
     """
@@ -14,76 +23,145 @@ def custom_sort_key(filename):
         return (row_num, part_num)
     return (float('inf'), float('inf'))
 
+def is_blank_array(gray, threshold=5):
+    """
+    检查灰度图是否为空白（平均灰度接近纯黑或纯白）。
+    """
+    avg_pixel_value = gray.mean()
+    return bool(avg_pixel_value < threshold or avg_pixel_value > 255 - threshold)
+
 def is_blank_image(image_path, threshold=5):
     """
-    检查图片是否为空白。
+    检查图片是否为空白（平均灰度接近纯黑或纯白）。
     """
     try:
         with Image.open(image_path) as img:
-            gray_img = img.convert('L')
-            pixels = list(gray_img.getdata())
-            avg_pixel_value = sum(pixels) / len(pixels)
-
-            if avg_pixel_value < threshold or avg_pixel_value > 255 - threshold:
-                return True
-            return False
+            return is_blank_array(np.asarray(img.convert('L')), threshold)
     except Exception as e:
         print(f"处理图片 {image_path} 时出错: {e}")
         return False
 
-def process_and_copy_images(folder_path, names_text):
+def _is_blank_entry(args):
+    return is_blank_image(*args)
+
+def target_name(char, ext, taken):
+    """按字库命名规则生成文件名；同一个字再次出现时依次保存为 字-2、字-3 …"""
+    stem = glyph_stem(char)
+    name = f"{stem}{ext}"
+    n = 1
+    while name in taken:
+        n += 1
+        name = f"{stem}-{n}{ext}"
+    taken.add(name)
+    return name
+
+def process_and_copy_images(folder_path, names_text, output_folder=None, threshold=5, link=False, workers=None, interactive=False):
+    """
+    筛掉空白图片，把其余图片按顺序以 names_text 中的字重命名，复制（或硬链接）到输出文件夹。
+
+    返回:
+    dict: 处理报告，含文件名对应关系、空白图片、图片数与文字数之差
+    """
     # 创建 output 文件夹
-    output_folder = os.path.join(folder_path, "output")
+    if output_folder is None:
+        output_folder = os.path.join(folder_path, "output")
     os.makedirs(output_folder, exist_ok=True)
     print(f"已确保输出文件夹 {output_folder} 存在。")
 
     # 获取文件夹中所有图片文件
-    all_image_files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
+    all_image_files = [f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS)]
 
     # 使用自定义排序键进行排序
     all_image_files.sort(key=custom_sort_key)
-    
-    # 存储非空白的图片路径
-    images_to_copy = []
-
-    # 第一步：筛选出非空白图片
-    print("\n正在筛选和删除空白图片...")
-    for image_name in all_image_files:
-        image_path = os.path.join(folder_path, image_name)
-        if not is_blank_image(image_path):
-            images_to_copy.append(image_path)
-        else:
-            print(f"检测到空白图片，跳过处理: {image_name}")
-    
+
+    # 第一步：筛选出非空白图片（多进程）
+    print("\n正在筛选空白图片...")
+    tasks = [(os.path.join(folder_path, f), threshold) for f in all_image_files]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        blank_flags = list(executor.map(_is_blank_entry, tasks, chunksize=32))
+    images_to_copy = [f for f, blank in zip(all_image_files, blank_flags) if not blank]
+    blank_images = [f for f, blank in zip(all_image_files, blank_flags) if blank]
+    for image_name in blank_images:
+        print(f"检测到空白图片，跳过处理: {image_name}")
+
     print("\n筛选完成。")
-    print(f"非空白图片数：{len(images_to_copy)}，等待处理文字数：{len(text_to_use)}。")
-    t = input()
+    print(f"非空白图片数：{len(images_to_copy)}，等待处理文字数：{len(names_text)}。")
+    if interactive:
+        input("按回车键继续...")
 
     # 第二步：复制并重命名到 output 文件夹
     print("\n正在复制和重命名图片...")
-    for i, char in enumerate(names_text):
-        if i < len(images_to_copy):
-            old_path = images_to_copy[i]
-            ext = os.path.splitext(old_path)[1]
-            new_name = f"{char}{ext}"
-            new_path = os.path.join(output_folder, new_name)
-
-            try:
+    # 同一次处理中重复的字保存为变体；与输出文件夹中已有文件同名时覆盖
+    taken = set()
+    mapping = []
+    for image_name, char in zip(images_to_copy, names_text):
+        old_path = os.path.join(folder_path, image_name)
+        ext = os.path.splitext(image_name)[1]
+        new_name = target_name(char, ext, taken)
+        new_path = os.path.join(output_folder, new_name)
+
+        try:
+            if link:
+                if os.path.exists(new_path):
+                    os.remove(new_path)
+                os.link(old_path, new_path)
+            else:
                 shutil.copy2(old_path, new_path)
-                print(f"已将 {os.path.basename(old_path)} 复制为 {new_name}")
-            except Exception as e:
-                print(f"复制 {old_path} 时出错: {e}")
-        else:
-            print("\n文字数已用完，剩下的图片将不会被复制。")
-            break
+            mapping.append({'source': image_name, 'char': char, 'target': new_name})
+            print(f"已将 {image_name} {'链接' if link else '复制'}为 {new_name}")
+        except Exception as e:
+            print(f"复制 {old_path} 时出错: {e}")
+
+    if len(images_to_copy) > len(names_text):
+        print("\n文字数已用完，剩下的图片将不会被复制。")
+    elif len(images_to_copy) < len(names_text):
+        print("\n图片数少于文字数，剩下的文字没有对应图片。")
 
     print("\n任务完成！")
-    
+    return {
+        'folder': folder_path,
+        'output': output_folder,
+        'images': len(all_image_files),
+        'blank': blank_images,
+        'chars': len(names_text),
+        'mismatch': len(images_to_copy) - len(names_text),
+        'unused_images': images_to_copy[len(names_text):],
+        'unused_chars': names_text[len(images_to_copy):],
+        'mapping': mapping,
+    }
+
 # 将 'your_text_here' 替换为您提供的中文字符串
 text_to_use = """宇宙汪霍鸟铺掖阿窗郊吴旷枯钟寂澎湃撼迥渺惆弟踪孟兼傲骄兽厌滩瘦挺挂枝垂峦灰掠凝片缓淌块絮击详沧桑错涨浮漾萦绕挥邮咸鸭蛋炽汗芒瓜冰棒叫矩娱桥乘艇谒儒讥县霸欺凌劝逊慎宅""".replace(" ", "").replace("\n", "")
 
-# 获取当前脚本所在的文件夹路径
-current_folder = '/Users/apple/Downloads/cropped_images'
+def main():
+    parser = argparse.ArgumentParser(description='筛掉空白切图，按文字顺序批量重命名')
+    parser.add_argument('folder', help='切图所在文件夹（cut_3.html 下载的图片）')
+    parser.add_argument('-t', '--text', help='按顺序对应各图片的文字 (默认: 脚本中的 text_to_use)')
+    parser.add_argument('-f', '--text-file', help='从文件读取文字，例如 char_coverage.py -o 的输出')
+    parser.add_argument('-o', '--output', help='输出文件夹 (默认: <folder>/output)')
+    parser.add_argument('--threshold', type=int, default=5, help='空白判定阈值：平均灰度低于该值或高于 255 减该值视为空白 (默认: 5)')
+    parser.add_argument('--link', action='store_true', help='创建硬链接而不是复制')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='进程数 (默认: CPU 核数)')
+    parser.add_argument('--report', help='把处理报告写入 JSON 文件')
+    parser.add_argument('--strict', action='store_true', help='非空白图片数与文字数不一致时返回非零退出码')
+    parser.add_argument('-i', '--interactive', action='store_true', help='筛选完成后暂停，确认数量后再复制')
+    args = parser.parse_args()
+
+    names_text = text_to_use
+    if args.text_file:
+        with open(args.text_file, encoding='utf-8') as f:
+            names_text = f.read()
+    elif args.text is not None:
+        names_text = args.text
+    names_text = re.sub(r'\s', '', names_text)
+
+    report = process_and_copy_images(args.folder, names_text, args.output, args.threshold,
+                                     args.link, args.workers, args.interactive)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+    if args.strict and report['mismatch'] != 0:
+        sys.exit(1)
 
-process_and_copy_images(current_folder, text_to_use)
-print("任务完成！")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,662 @@
+# -*- coding: utf-8 -*-
+"""
+无浏览器的排版与 PDF 导出，排版规则与 index.html 的 layoutPage() 一致
+（智能标点、中西文间距、多栏、<[N]> 边距标记、nextPage 正反页切换），预设直接读取 configs.js。
+
+页面逐页排版、逐页写入 PDF：每个字图和背景在一份 PDF 中只嵌入一次，
+页面内容只是对它们的引用和横线，不生成整页位图，适合在服务器上批量处理长文档。
+
+示例:
+    python render.py essay.txt -p kokuyo-line-front -o rendered
+    python render.py docs/*.txt -o rendered -w 4
+"""
+import argparse
+import json
+import math
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+import numpy as np
+
+from glyph_store import open_store
+from glyphs import load_manifest, scan_glyphs
+
+# 画布宽度（CSS 像素），实际按 2 倍绘制，与 index.html 一致
+TARGET_WIDTH = 800
+# PDF 中 1 个画布像素（2 倍）对应的长度（pt），即 1 CSS 像素 = 0.75 pt（96 dpi）
+PT_PER_PX = 0.375
+
+MARGIN_RE = re.compile(r'<\[([+-]?\d+)\]>')
+_ASTRAL_RE = re.compile('[\U00010000-\U0010FFFF]')
+_PUNCTUATION_RE = re.compile(r'[，。！？\?\.…—、；："\'‘’“”《》（）\(\)【】\*\[\]]')
+
+def is_chinese(char):
+    return '\u4e00' <= char <= '\u9fa5'
+
+def is_western(char):
+    return re.fullmatch(r'[a-zA-Z0-9]', char) is not None
+
+def is_punctuation(char):
+    return _PUNCTUATION_RE.fullmatch(char) is not None
+
+def _js_round(value):
+    return math.floor(value + 0.5)
+
+# ---------------------------------------------------------------------------
+# configs.js
+# ---------------------------------------------------------------------------
+
+_JS_TOKEN_RE = re.compile(r'("(?:\\.|[^"\\])*")|//[^\n]*|/\*.*?\*/|\b([A-Za-z_]\w*)(\s*:)', re.S)
+
+def _js_object_to_json(text):
+    """把 configs.js 中的对象字面量转成 JSON：去掉注释，给键加引号，去掉末尾逗号。"""
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        if match.group(2):
+            return f'"{match.group(2)}"{match.group(3)}'
+        return ''
+    text = _JS_TOKEN_RE.sub(replace, text)
+    return re.sub(r',(\s*[}\]])', r'\1', text)
+
+def _balanced_object(text, start):
+    """返回 text 中从 start 处的 '{' 开始、到与之匹配的 '}' 为止的子串。"""
+    depth = 0
+    in_string = False
+    i = start
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if char == '\\':
+                i += 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+        i += 1
+    raise ValueError('configs.js 中的对象未闭合')
+
+def load_presets(path='configs.js'):
+    """
+    读取 configs.js 中的预设。
+
+    返回:
+    dict: config_dict 中的名称 -> 预设，背景图路径转换为相对于当前目录的路径
+    """
+    with open(path, encoding='utf-8') as f:
+        source = f.read()
+    base = os.path.dirname(os.path.abspath(path))
+
+    objects = {}
+    for match in re.finditer(r'\bconst\s+(\w+)\s*=\s*\{', source):
+        body = _balanced_object(source, match.end() - 1)
+        if match.group(1) == 'config_dict':
+            pairs = re.findall(r'"([^"]+)"\s*:\s*(\w+)', body)
+            return {name: objects[ident] for name, ident in pairs}
+        preset = json.loads(_js_object_to_json(body))
+        if 'background' in preset:
+            preset['background'] = os.path.relpath(os.path.join(base, preset['background']))
+        objects[match.group(1)] = preset
+    raise ValueError(f'{path} 中没有 config_dict')
+
+# ---------------------------------------------------------------------------
+# 字图与背景
+# ---------------------------------------------------------------------------
+
+class GlyphSet:
+    """
+    按字库清单 manifest.json 查找字图及其变体（没有清单时扫描文件夹），
+    与 index.html 一致。排版只用清单中的尺寸，字图在写入 PDF 时才解码；
+    字库已用 glyph_store.py 打包且未过期时直接从打包文件中取位图，不再逐个解码 PNG；
+    export_glyphs.py 导出的精简字库中字图只含裁剪框内的部分，由 place() 换算绘制位置。
+    加载结果缓存在内存中，可跨文档复用。
+    """
+
+    def __init__(self, folder='output_chars_ds'):
+        self.folder = folder
+        # 1 位的打包文件丢失了灰度，与 PNG 渲染结果不同，不使用
+        self._store = open_store(folder)
+        if self._store is not None and self._store.bits != 8:
+            self._store = None
+        manifest = self._store.manifest() if self._store is not None else load_manifest(folder)
+        if manifest is not None:
+            self._files = {char: [entry[0] for entry in entries] for char, entries in manifest['glyphs'].items()}
+            self._sizes = {char: [(entry[1], entry[2]) for entry in entries] for char, entries in manifest['glyphs'].items()}
+            self._trims = {char: [entry[4] for entry in entries] for char, entries in manifest['glyphs'].items()
+                           if len(entries[0]) > 4}
+        else:
+            self._files = scan_glyphs(folder)
+            self._sizes = {}
+            self._trims = {}
+        self._cache = {}
+
+    def variant_count(self, char):
+        return len(self._files.get(char, ()))
+
+    def size(self, char, variant=0):
+        """返回字图的 (宽, 高)，缺字返回 None。"""
+        if char not in self._files:
+            return None
+        if char not in self._sizes:
+            sizes = []
+            for filename in self._files[char]:
+                # 只读取文件头
+                with Image.open(os.path.join(self.folder, filename)) as img:
+                    sizes.append(img.size)
+            self._sizes[char] = sizes
+        return self._sizes[char][variant]
+
+    def place(self, char, variant, x, y, w, h):
+        """
+        字图在页面上的绘制区域。(x, y, w, h) 为排版得到的整个字图格子；精简字库中只绘制裁剪框，
+        空白字图返回 None。
+        """
+        if char not in self._trims:
+            return x, y, w, h
+        trim = self._trims[char][variant]
+        if trim is None:
+            return None
+        width, height = self._sizes[char][variant]
+        sx, sy = w / width, h / height
+        return x + trim[0] * sx, y + trim[1] * sy, (trim[2] - trim[0]) * sx, (trim[3] - trim[1]) * sy
+
+    def get(self, char, variant=0):
+        """返回字图（PIL.Image），缺字或空白字图返回 None。"""
+        key = (char, variant)
+        if key not in self._cache:
+            img = None
+            if self._store is not None:
+                if char in self._store:
+                    img = Image.fromarray(np.array(self._store.get(char, variant)))
+            elif char in self._files and self._files[char][variant] is not None:
+                with Image.open(os.path.join(self.folder, self._files[char][variant])) as f:
+                    # 精简字库中的调色板、1 位字图都是灰度，按灰度嵌入 PDF
+                    img = f.convert('L') if char in self._trims else f.copy()
+            self._cache[key] = img
+        return self._cache[key]
+
+def page_size(background):
+    """画布尺寸（2 倍像素）：宽 1600，高按背景图比例，与 index.html 的 resizeCanvas 一致。"""
+    width, height = background.size
+    scale = TARGET_WIDTH / width
+    return TARGET_WIDTH * 2, _js_round(height * scale) * 2
+
+_backgrounds = {}
+
+def load_background(path):
+    if path not in _backgrounds:
+        with Image.open(path) as img:
+            img.load()
+            _backgrounds[path] = img.copy()
+    return _backgrounds[path]
+
+# ---------------------------------------------------------------------------
+# 排版
+# ---------------------------------------------------------------------------
+
+class Page:
+    """一页的排版结果。glyphs: [(字符, 变体序号, x, y, 宽, 高)]，坐标为 2 倍画布像素。"""
+
+    def __init__(self, config, glyphs, missing):
+        self.config = config
+        self.glyphs = glyphs
+        self.missing = missing
+
+class Line:
+    """
+    分词后的一行 source[start:end]。pure 为去掉边距标记后的文字，switches 为各标记
+    (在 pure 中的位置, delta, 在行中的位置, 排版时跳过的长度, 标记长度)。
+    """
+
+    __slots__ = ('start', 'end', 'pure', 'switches')
+
+    def __init__(self, source, start, end):
+        raw = source[start:end]
+        parts = []
+        switches = []
+        pure_len = 0
+        last_idx = 0
+        for match in MARGIN_RE.finditer(raw):
+            parts.append(raw[last_idx:match.start()])
+            pure_len += match.start() - last_idx
+            delta = int(match.group(1))
+            # index.html 按 `<[${delta}]>` 的长度跳过标记（<[+5]> 会少跳一个字符），保持一致
+            switches.append((pure_len, delta, match.start(), len(f'<[{delta}]>'), match.end() - match.start()))
+            last_idx = match.end()
+        parts.append(raw[last_idx:])
+        self.start = start
+        self.end = end
+        self.pure = ''.join(parts)
+        self.switches = switches
+
+def _utf16_units(match):
+    code = ord(match.group()) - 0x10000
+    return chr(0xD800 + (code >> 10)) + chr(0xDC00 + (code & 0x3FF))
+
+def tokenize(text):
+    """
+    分词，与 index.html 的 tokenizeText() 一致。网页版按 UTF-16 码元逐个排版，
+    BMP 之外的字（如 𠀋）拆成两个代理项，各按缺字占一格，这里同样拆开。
+
+    返回:
+    tuple: (source, lines)，source 为 —— 替换为 ¨ 后的全文，lines 为按 \\r?\\n 切分的 Line 列表
+    """
+    source = _ASTRAL_RE.sub(_utf16_units, text.replace('——', '¨'))
+    lines = []
+    start = 0
+    while True:
+        newline = source.find('\n', start)
+        end = len(source) if newline < 0 else newline
+        if newline > start and source[newline - 1] == '\r':
+            end -= 1
+        lines.append(Line(source, start, end))
+        if newline < 0:
+            return source, lines
+        start = newline + 1
+
+def _line_view(line, source, pos):
+    """
+    从 pos 开始的一行（换页后第一行可能从行中间开始）。
+
+    返回:
+    tuple: (pure, switches, 起点在 pure 中的位置, 起点之后的第一个标记序号, 起点在行中的位置)
+    """
+    rel = pos - line.start
+    if rel <= 0:
+        return line.pure, line.switches, 0, 0, 0
+    if pos >= line.end:
+        return '', [], 0, 0, 0
+    i0 = rel
+    s0 = 0
+    for switch in line.switches:
+        if switch[2] >= rel:
+            break
+        if switch[2] + switch[4] > rel:
+            # 起点落在标记中间，剩下的部分不再是标记，重新解析
+            rest = Line(source, pos, line.end)
+            return rest.pure, rest.switches, 0, 0, 0
+        i0 -= switch[4]
+        s0 += 1
+    return line.pure, line.switches, i0, s0, rel
+
+def _layout_page(tokens, pos, line_idx, page_config, glyphs, variant_counters):
+    """
+    从 source 的 pos 处（位于第 line_idx 行）开始排一页，逐句对应 index.html 的 layoutPage()，
+    换页位置与网页版一致。variant_counters 记录每个字已使用的次数，用于轮换变体。
+
+    返回:
+    tuple: (Page, 下一页的起点, 是否已排完)
+    """
+    source, lines = tokens
+    column = page_config.get('columns') or 1
+    text_frames = page_config['textFrame']
+    line_height = page_config['lineHeight']
+    font_size = page_config['fontSize']
+    smart_punctuation = page_config['smartPunctuation']
+    line_count = page_config['lineCount']
+
+    placed = []
+    missing = []
+
+    current_column = 0
+    column_y0 = [text_frames[c][0] * 2 for c in range(column)]
+    column_y = column_y0[:]
+    column_max_x = [text_frames[c][2] * 2 for c in range(column)]
+    column_line_count = [0] * column
+
+    def done(finished):
+        return Page(page_config, placed, missing), pos, finished
+
+    for l in range(line_idx, len(lines)):
+        pure_line, margin_switches, i0, switch_idx, raw_idx = _line_view(
+            lines[l], source, pos if l == line_idx else lines[l].start)
+        this_line_left_margin = text_frames[current_column][1]
+        x = this_line_left_margin * 2
+        y = column_y[current_column]
+
+        for i in range(i0, len(pure_line)):
+            # 检查是否需要切换 margin
+            if switch_idx < len(margin_switches) and i == margin_switches[switch_idx][0]:
+                _, delta, _, mark_len, _ = margin_switches[switch_idx]
+                this_line_left_margin = text_frames[current_column][1] + delta
+                x = this_line_left_margin * 2
+                pos += mark_len
+                raw_idx += mark_len
+                switch_idx += 1
+            while switch_idx < len(margin_switches) and raw_idx == margin_switches[switch_idx][2]:
+                _, delta, _, mark_len, _ = margin_switches[switch_idx]
+                pos += mark_len
+                raw_idx += mark_len
+                this_line_left_margin = text_frames[current_column][1] + delta
+                x = this_line_left_margin * 2
+                switch_idx += 1
+
+            char = pure_line[i]
+            if char == ' ':
+                x += font_size / 3.5 * 2
+                pos += 1
+                raw_idx += 1
+                continue
+            if char == '\t':
+                x += 40 * 2
+                pos += 1
+                raw_idx += 1
+                continue
+
+            # 轮换变体
+            used = variant_counters.get(char, 0)
+            variant_counters[char] = used + 1
+            variant = used % max(1, glyphs.variant_count(char))
+            size = glyphs.size(char, variant)
+
+            # 计算字符尺寸（只用清单中的尺寸，不解码字图）
+            scale = (font_size * 2) / size[1] if size else 1
+            char_width = size[0] * scale if size else 35
+            char_height = font_size * 2
+
+            # 换行处理
+            if x + char_width > column_max_x[current_column]:
+                if not (smart_punctuation and is_punctuation(char)):
+                    x = this_line_left_margin * 2
+                    y += line_height * 2
+                    column_y[current_column] = y
+                    column_line_count[current_column] += 1
+                    if column_line_count[current_column] > line_count:
+                        current_column += 1
+                        if current_column >= column:
+                            return done(False)
+                        # 切换到新列
+                        x = text_frames[current_column][1] * 2
+                        y = column_y0[current_column]
+                        this_line_left_margin = text_frames[current_column][1]
+
+            if size:
+                placed.append((char, variant, x, y, char_width, char_height))
+            else:
+                missing.append(char)
+
+            x += char_width
+
+            # 中英文间隔处理
+            if i + 1 < len(pure_line):
+                next_char = pure_line[i + 1]
+                if not is_punctuation(next_char):
+                    if (is_chinese(char) and is_western(next_char)) or (is_western(char) and is_chinese(next_char)):
+                        x += 5 * 2
+
+            pos += 1
+            raw_idx += 1
+
+        # 一行结束，换行
+        y += line_height * 2
+        column_y[current_column] = y
+        column_line_count[current_column] += 1
+
+        # 行尾跳过换行符
+        if source[pos:pos + 1] == '\r':
+            pos += 1
+        if source[pos:pos + 1] == '\n':
+            pos += 1
+
+        # 换页判断：排完一行后再判断
+        if column_line_count[current_column] > line_count:
+            current_column += 1
+            if current_column >= column:
+                return done(False)
+
+    return done(True)
+
+def layout_pages(text, preset, presets, glyphs):
+    """逐页生成排版结果（Page），按预设的 nextPage 切换下一页的预设。全文只分词一次，游标只前进不回退。"""
+    tokens = tokenize(text)
+    lines = tokens[1]
+    page_config = preset
+    variant_counters = {}
+    pos = 0
+    line_idx = 0
+    while True:
+        # 找到 pos 所在的行
+        while line_idx + 1 < len(lines) and lines[line_idx + 1].start <= pos:
+            line_idx += 1
+        page, next_pos, finished = _layout_page(tokens, pos, line_idx, page_config, glyphs, variant_counters)
+        yield page
+        if finished:
+            return
+        if next_pos == pos:
+            raise ValueError(f"预设 {page_config['name']} 一页排不下任何内容")
+        pos = next_pos
+        page_config = presets.get(page_config.get('nextPage'), page_config)
+
+# ---------------------------------------------------------------------------
+# PDF
+# ---------------------------------------------------------------------------
+
+class PdfWriter:
+    """
+    最小的 PDF 写入器：对象生成后立即写入文件，只在内存中保留对象偏移量，
+    页面对象逐页追加，页面树和交叉引用表在 close() 时写出。
+    用作上下文管理器时，出错则不写交叉引用表，删除写了一半的文件，异常照常抛出。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._offsets = {}
+        self._next_id = 3  # 1: Catalog, 2: Pages
+        self._pages = []
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _reserve(self):
+        obj_id = self._next_id
+        self._next_id += 1
+        return obj_id
+
+    def _write(self, obj_id, dictionary, stream=None):
+        self._offsets[obj_id] = self._file.tell()
+        self._file.write(f'{obj_id} 0 obj\n'.encode())
+        if stream is None:
+            self._file.write(dictionary.encode() + b'\nendobj\n')
+            return
+        self._file.write(f'{dictionary[:-2]} /Length {len(stream)} >>\nstream\n'.encode())
+        self._file.write(stream)
+        self._file.write(b'\nendstream\nendobj\n')
+
+    def add_image(self, img):
+        """嵌入一张图片（PIL.Image），带透明通道时附加 SMask。返回对象编号。"""
+        alpha = None
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            img = img.convert('RGBA')
+            alpha = img.getchannel('A')
+            img = img.convert('RGB')
+        elif img.mode not in ('L', 'RGB'):
+            img = img.convert('RGB')
+
+        smask = ''
+        if alpha is not None and alpha.getextrema() != (255, 255):
+            smask_id = self._reserve()
+            self._write(smask_id, f'<< /Type /XObject /Subtype /Image /Width {alpha.width} /Height {alpha.height} '
+                                  f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode >>',
+                        zlib.compress(alpha.tobytes()))
+            smask = f' /SMask {smask_id} 0 R'
+
+        obj_id = self._reserve()
+        colorspace = '/DeviceGray' if img.mode == 'L' else '/DeviceRGB'
+        self._write(obj_id, f'<< /Type /XObject /Subtype /Image /Width {img.width} /Height {img.height} '
+                            f'/ColorSpace {colorspace} /BitsPerComponent 8 /Interpolate true{smask} /Filter /FlateDecode >>',
+                    zlib.compress(img.tobytes()))
+        return obj_id
+
+    def add_page(self, width, height, content, xobjects):
+        """添加一页。width/height 单位为 pt；xobjects: 资源名 -> 图片对象编号。"""
+        content_id = self._reserve()
+        self._write(content_id, '<< /Filter /FlateDecode >>', zlib.compress(content))
+        resources = ' '.join(f'/{name} {obj_id} 0 R' for name, obj_id in xobjects.items())
+        page_id = self._reserve()
+        self._write(page_id, f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] '
+                             f'/Resources << /XObject << {resources} >> >> /Contents {content_id} 0 R >>')
+        self._pages.append(page_id)
+
+    def close(self):
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self._pages)
+        self._write(2, f'<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>')
+        self._write(1, '<< /Type /Catalog /Pages 2 0 R >>')
+        xref = self._file.tell()
+        self._file.write(f'xref\n0 {self._next_id}\n0000000000 65535 f \n'.encode())
+        for obj_id in range(1, self._next_id):
+            self._file.write(f'{self._offsets[obj_id]:010d} 00000 n \n'.encode())
+        self._file.write(f'trailer\n<< /Size {self._next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+        self._file.close()
+
+    def abort(self):
+        """放弃写入：关闭并删除输出文件。"""
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+            return
+        try:
+            self.close()
+        except BaseException:
+            self.abort()
+            raise
+
+def _hex_color(color):
+    color = color.lstrip('#')
+    if len(color) == 3:
+        color = ''.join(c * 2 for c in color)
+    return ' '.join(f'{int(color[i:i + 2], 16) / 255:.4f}' for i in (0, 2, 4))
+
+def _page_content(page, width, height, names, glyphs):
+    """
+    生成页面内容流。坐标先变换为画布坐标系（左上角为原点，单位为 2 倍画布像素），
+    绘制顺序与 index.html 一致：背景、字、横线。
+    """
+    config = page.config
+    ops = [f'{PT_PER_PX} 0 0 {-PT_PER_PX} 0 {height * PT_PER_PX:.4f} cm']
+    ops.append(f'q {width} 0 0 {-height} 0 {height} cm /{names["background"]} Do Q')
+    for char, variant, *cell in page.glyphs:
+        rect = glyphs.place(char, variant, *cell)
+        if rect is None:
+            continue
+        x, y, w, h = rect
+        ops.append(f'q {w:.4f} 0 0 {-h:.4f} {x:.4f} {y + h:.4f} cm /{names[char, variant]} Do Q')
+
+    if config.get('showLines'):
+        ops.append(f'{_hex_color(config["lineColor"])} RG {config["lineWidth"]} w')
+        line_y = config['lineFrame'][0] * 2
+        left, right = config['lineFrame'][1] * 2, config['lineFrame'][2] * 2
+        for _ in range(config['lineCount']):
+            ops.append(f'{left} {line_y:.4f} m {right} {line_y:.4f} l S')
+            line_y += config['lineHeight'] * 2
+        # 额外的线条
+        for line_width, color, left, top, right, bottom in config.get('additional', []):
+            ops.append(f'{_hex_color(color)} RG {line_width} w {left * 2} {top * 2} m {right * 2} {bottom * 2} l S')
+    return '\n'.join(ops).encode()
+
+def render_pdf(text, output_path, preset='kokuyo-line-front', glyphs='output_chars_ds', presets='configs.js'):
+    """
+    排版 text 并写入 output_path。
+
+    参数:
+    glyphs: 字库文件夹或 GlyphSet（批量处理时传入同一个 GlyphSet 以复用缓存）
+    presets: configs.js 路径或 load_presets() 的结果
+
+    返回:
+    dict: {'pages': 页数, 'missing': {缺失字符: 次数}}
+    """
+    if isinstance(glyphs, str):
+        glyphs = GlyphSet(glyphs)
+    if isinstance(presets, str):
+        presets = load_presets(presets)
+
+    missing = {}
+    pages = 0
+    images = {}  # (字符, 变体序号) 或背景 -> 对象编号
+    with PdfWriter(output_path) as pdf:
+        for page in layout_pages(text, presets[preset], presets, glyphs):
+            background = load_background(page.config['background'])
+            width, height = page_size(background)
+
+            key = ('background', page.config['background'])
+            if key not in images:
+                # 与画布一致：背景缩放到画布尺寸，透明处为白色
+                scaled = background.convert('RGBA').resize((width, height), Image.LANCZOS)
+                flat = Image.new('RGB', scaled.size, (255, 255, 255))
+                flat.paste(scaled, mask=scaled.getchannel('A'))
+                images[key] = pdf.add_image(flat)
+
+            names = {'background': f'B{images[key]}'}
+            xobjects = {names['background']: images[key]}
+            for char, variant, *_ in page.glyphs:
+                key = (char, variant)
+                if key not in images:
+                    img = glyphs.get(char, variant)
+                    if img is None:
+                        continue
+                    images[key] = pdf.add_image(img)
+                names[key] = f'G{images[key]}'
+                xobjects[names[key]] = images[key]
+
+            pdf.add_page(width * PT_PER_PX, height * PT_PER_PX, _page_content(page, width, height, names, glyphs), xobjects)
+            pages += 1
+            for char in page.missing:
+                missing[char] = missing.get(char, 0) + 1
+    return {'pages': pages, 'missing': missing}
+
+# 每个进程复用的字库与预设
+_worker_glyphs = None
+_worker_presets = None
+
+def _render_file(args):
+    global _worker_glyphs, _worker_presets
+    input_path, output_path, preset, glyph_dir, config_path = args
+    if _worker_glyphs is None:
+        _worker_glyphs = GlyphSet(glyph_dir)
+        _worker_presets = load_presets(config_path)
+    with open(input_path, encoding='utf-8') as f:
+        text = f.read()
+    return render_pdf(text, output_path, preset, _worker_glyphs, _worker_presets)
+
+def main():
+    parser = argparse.ArgumentParser(description='排版文本并导出 PDF（与 index.html 排版一致）')
+    parser.add_argument('inputs', nargs='+', help='文本文件（UTF-8）')
+    parser.add_argument('-p', '--preset', default='kokuyo-line-front', help='configs.js 中的预设名称 (默认: kokuyo-line-front)')
+    parser.add_argument('-o', '--output', default='rendered', help='PDF 输出文件夹 (默认: rendered)')
+    parser.add_argument('-g', '--glyphs', default='output_chars_ds', help='字库文件夹 (默认: output_chars_ds)')
+    parser.add_argument('-c', '--configs', default='configs.js', help='预设文件 (默认: configs.js)')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='并行处理的进程数 (默认: 1)')
+    args = parser.parse_args()
+
+    if args.preset not in load_presets(args.configs):
+        parser.error(f'未知预设: {args.preset}')
+    os.makedirs(args.output, exist_ok=True)
+
+    tasks = []
+    for input_path in args.inputs:
+        name = os.path.splitext(os.path.basename(input_path))[0]
+        tasks.append((input_path, os.path.join(args.output, f'{name}.pdf'), args.preset, args.glyphs, args.configs))
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for (input_path, output_path, *_), result in zip(tasks, executor.map(_render_file, tasks)):
+            missing = ''.join(sorted(result['missing'], key=result['missing'].get, reverse=True))
+            # 重新组合成对的代理项，落单的显示为 �
+            missing = missing.encode('utf-16-le', 'surrogatepass').decode('utf-16-le', 'replace')
+            print(f"{input_path} -> {output_path}: {result['pages']} 页，缺失字符 {len(result['missing'])} 个 {missing}")
+
+if __name__ == '__main__':
+    main()
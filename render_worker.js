@@ -0,0 +1,46 @@
+// index.html 的绘制线程：按主线程排好的位置在 OffscreenCanvas 上绘制一页，返回 ImageBitmap。
+// 消息 { id, width, height, background, glyphs: [{ src, sx, sy, sw, sh, x, y, width, height }], lines: [[线宽, 颜色, x1, y1, x2, y2]] }
+// 图片地址相对于本文件，本文件须与 index.html 放在同一目录
+
+// 图片缓存：地址 -> Promise<ImageBitmap | null>，背景、图集和字图都只加载、解码一次
+const images = new Map();
+function loadImage(src) {
+    if (!images.has(src)) {
+        images.set(src, fetch(src)
+            .then(res => res.ok ? res.blob() : null)
+            .then(blob => blob && createImageBitmap(blob))
+            .catch(() => null));
+    }
+    return images.get(src);
+}
+
+self.onmessage = async e => {
+    const { id, width, height, background, glyphs, lines } = e.data;
+    try {
+        const canvas = new OffscreenCanvas(width, height);
+        const ctx = canvas.getContext('2d');
+
+        const [backgroundImg, ...sources] = await Promise.all([loadImage(background), ...glyphs.map(g => loadImage(g.src))]);
+        if (backgroundImg) {
+            ctx.drawImage(backgroundImg, 0, 0, width, height);
+        }
+        glyphs.forEach((g, i) => {
+            if (sources[i]) {
+                ctx.drawImage(sources[i], g.sx, g.sy, g.sw, g.sh, g.x, g.y, g.width, g.height);
+            }
+        });
+        for (const [lineWidth, color, x1, y1, x2, y2] of lines) {
+            ctx.strokeStyle = color;
+            ctx.lineWidth = lineWidth;
+            ctx.beginPath();
+            ctx.moveTo(x1, y1);
+            ctx.lineTo(x2, y2);
+            ctx.stroke();
+        }
+
+        const bitmap = canvas.transferToImageBitmap();
+        self.postMessage({ id, bitmap }, [bitmap]);
+    } catch (err) {
+        self.postMessage({ id, error: String(err) });
+    }
+};
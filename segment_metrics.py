@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+自动分割服务的分阶段计时与 Prometheus 指标。
+
+请求线程开始时调用 begin()，各阶段用 timed('阶段名') 计时，同一请求中同名阶段累加；
+请求结束时 end() 取出本次各阶段耗时，observe_request() 计入直方图。
+进程池中的计算用 call_with_timings() 包装，计时结果随返回值带回主进程再 merge()。
+
+render() 输出 Prometheus 文本格式（0.0.4），不依赖 prometheus_client。
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# 延迟直方图的桶上限（秒）
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+def begin():
+    """开始记录当前线程（一次请求或一次计算任务）的阶段耗时。"""
+    _local.timings = {}
+
+def end():
+    """结束记录，返回 {阶段: 秒}；没有调用过 begin() 时返回空字典。"""
+    timings = getattr(_local, 'timings', None) or {}
+    _local.timings = None
+    return timings
+
+def record(stage, seconds):
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def merge(timings):
+    """把进程池带回的阶段耗时合并到当前请求。"""
+    for stage, seconds in timings.items():
+        record(stage, seconds)
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+def call_with_timings(fn, *args):
+    """
+    在计算进程中执行 fn 并记录其各阶段耗时。
+
+    返回:
+    tuple: (fn 的返回值, {阶段: 秒}, fn 的总耗时秒数)
+    """
+    begin()
+    start = time.perf_counter()
+    try:
+        result = fn(*args)
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = end()
+    return result, timings, elapsed
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        # 没有标签的计数器从 0 开始输出
+        self._values = {} if self.label_names else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(dict(zip(self.label_names, key)))} {value}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # 标签 -> [各桶计数（不累计）..., +Inf 桶计数, 总和]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.label_names)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            counts = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            counts[index] += 1
+            counts[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, counts in sorted(self._values.items()):
+                labels = dict(zip(self.label_names, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else repr(float(bound))
+                    lines.append(f'{self.name}_bucket{_format_labels({**labels, "le": le})} {cumulative}')
+                lines.append(f'{self.name}_sum{_format_labels(labels)} {counts[-1]}')
+                lines.append(f'{self.name}_count{_format_labels(labels)} {cumulative}')
+        return lines
+
+class Gauge:
+    """取值时调用 fn()，用于缓存大小、排队任务数等现成的状态。"""
+
+    def __init__(self, name, help_text, fn, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}', f'{self.name} {self.fn()}']
+
+requests_total = Counter('segment_requests_total', '按接口和状态码统计的请求数', ('endpoint', 'status'))
+request_seconds = Histogram('segment_request_duration_seconds', '请求总耗时', ('endpoint',))
+stage_seconds = Histogram('segment_stage_duration_seconds', '每次请求在各阶段的耗时（同一请求中同名阶段累加）',
+                          ('endpoint', 'stage'))
+_metrics = [requests_total, request_seconds, stage_seconds]
+
+def register(metric):
+    _metrics.append(metric)
+    return metric
+
+def observe_request(endpoint, status, seconds, timings):
+    requests_total.inc(endpoint=endpoint, status=status)
+    request_seconds.observe(seconds, endpoint=endpoint)
+    for stage, stage_time in timings.items():
+        stage_seconds.observe(stage_time, endpoint=endpoint, stage=stage)
+
+def server_timing(timings, total=None):
+    """生成 Server-Timing 响应头，单位毫秒。"""
+    entries = [f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in timings.items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+def render():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
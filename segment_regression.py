@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+auto_segment.find_split_positions 的回归样本。
+
+build: 用 handwriting_chars 中的字图拼出若干示例页面，逐行二值化并求垂直投影，
+       用当前实现计算分割点，连同投影一起保存到 fixtures/segment_regression.npz。
+check: 读取样本，用当前实现重新计算，逐行比对分割点是否完全一致。
+
+修改分割算法前先 build（或使用已提交的样本），修改后 check。
+"""
+import argparse
+import os
+import random
+import sys
+
+import cv2
+import numpy as np
+
+from auto_segment import binarize, find_split_positions
+from glyphs import ink_box
+
+FIXTURE_PATH = os.path.join('fixtures', 'segment_regression.npz')
+
+# (min_char_width, max_char_width)：默认参数之外，加入窄窗口和宽窗口的组合，
+# 覆盖 Savitzky–Golay 窗口小于 11、区域过短等分支
+PARAM_SETS = [(30, 80), (10, 40), (2, 4), (30, 200)]
+
+def compose_page(glyph_dir, seed, width, line_count=25, line_height=70, margin=100, placements=None):
+    """
+    用字图拼出一张横线稿纸样式的示例页面。
+
+    字距在 [-8, 12] 像素之间随机，负字距让相邻字粘连，
+    从而产生需要局部最小值切分的宽字符区域。
+    给出 placements 列表时，按行追加该行每个字的墨迹左右边界 [(左, 右), ...]（右侧不含），
+    供 segment_sweep.py 生成标注；没有墨迹的字不记录。
+
+    返回:
+    tuple: (灰度页面, 行带列表)
+    """
+    rnd = random.Random(seed)
+    files = sorted(f for f in os.listdir(glyph_dir) if f.lower().endswith('.png'))
+    page = np.full((margin * 2 + line_height * (line_count + 1), width), 250, np.uint8)
+    bands = []
+    for line in range(line_count + 1):
+        top = margin + line * line_height
+        bands.append((top, top + line_height))
+        line_ink = []
+        x = 20
+        while True:
+            glyph = cv2.imread(os.path.join(glyph_dir, rnd.choice(files)), cv2.IMREAD_GRAYSCALE)
+            if glyph is None:
+                continue
+            h = line_height - 10
+            w = max(1, int(glyph.shape[1] * h / glyph.shape[0]))
+            if x + w > width - 20:
+                break
+            glyph = cv2.resize(glyph, (w, h))
+            region = page[top + 5:top + 5 + h, x:x + w]
+            np.minimum(region, glyph, out=region)
+            box = ink_box(glyph) if placements is not None else None
+            if box is not None:
+                line_ink.append((x + box[0], x + box[2]))
+            x += w + rnd.randint(-8, 12)
+        if placements is not None:
+            placements.append(line_ink)
+    return page, bands
+
+def build(glyph_dir, path=FIXTURE_PATH):
+    projections = []
+    # 示例页面：普通宽度与 600 dpi 宽幅各一组
+    for seed, width in [(0, 1600), (1, 1600), (2, 4800)]:
+        page, bands = compose_page(glyph_dir, seed, width)
+        for top, bottom in bands:
+            projections.append(np.sum(binarize(page[top:bottom]), axis=0))
+
+    # 随机投影：覆盖首尾非零、孤立零点等页面上少见的情况
+    rng = np.random.default_rng(0)
+    for _ in range(40):
+        projection = rng.integers(0, 4000, size=int(rng.integers(50, 600)))
+        projection[rng.random(projection.size) < 0.08] = 0
+        projections.append(projection)
+
+    proj_flat = np.concatenate(projections).astype(np.int64)
+    proj_offsets = np.cumsum([0] + [len(p) for p in projections])
+
+    raw_flat, raw_offsets = [], [0]
+    valid_flat, valid_offsets = [], [0]
+    for min_char_width, max_char_width in PARAM_SETS:
+        for projection in projections:
+            raw, valid = find_split_positions(projection, min_char_width, max_char_width)
+            raw_flat.extend(int(p) for p in raw)
+            raw_offsets.append(len(raw_flat))
+            valid_flat.extend(valid)
+            valid_offsets.append(len(valid_flat))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(
+        path,
+        params=np.array(PARAM_SETS, dtype=np.int64),
+        proj_flat=proj_flat,
+        proj_offsets=proj_offsets,
+        raw_flat=np.array(raw_flat, dtype=np.int64),
+        raw_offsets=np.array(raw_offsets, dtype=np.int64),
+        valid_flat=np.array(valid_flat, dtype=np.int64),
+        valid_offsets=np.array(valid_offsets, dtype=np.int64),
+    )
+    print(f"已保存 {len(projections)} 条投影 × {len(PARAM_SETS)} 组参数到 {path}")
+
+def check(path=FIXTURE_PATH):
+    """逐行比对；全部一致返回 True。"""
+    data = np.load(path)
+    proj_offsets = data['proj_offsets']
+    projections = [data['proj_flat'][a:b] for a, b in zip(proj_offsets[:-1], proj_offsets[1:])]
+
+    case = 0
+    mismatches = 0
+    for min_char_width, max_char_width in data['params']:
+        for index, projection in enumerate(projections):
+            raw, valid = find_split_positions(projection, int(min_char_width), int(max_char_width))
+            expected_raw = data['raw_flat'][data['raw_offsets'][case]:data['raw_offsets'][case + 1]]
+            expected_valid = data['valid_flat'][data['valid_offsets'][case]:data['valid_offsets'][case + 1]]
+            if list(map(int, raw)) != expected_raw.tolist() or list(valid) != expected_valid.tolist():
+                mismatches += 1
+                print(f"不一致: 投影 {index}，参数 ({min_char_width}, {max_char_width})")
+            case += 1
+
+    print(f"共比对 {case} 组，不一致 {mismatches} 组。")
+    return mismatches == 0
+
+def main():
+    parser = argparse.ArgumentParser(description='分割算法回归样本')
+    parser.add_argument('command', choices=['build', 'check'])
+    parser.add_argument('-g', '--glyphs', default='handwriting_chars', help='用于拼页的字图文件夹 (默认: handwriting_chars)')
+    parser.add_argument('-f', '--fixture', default=FIXTURE_PATH, help=f'样本路径 (默认: {FIXTURE_PATH})')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build(args.glyphs, args.fixture)
+    elif not check(args.fixture):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+分割参数扫描：在带标注的页面上并行评估一组参数组合，按 F1（准确率、召回率）和耗时排序，
+可把最好的一组保存为扫描仪配置，供 auto_segment.py 的 profile 参数使用。
+
+标注由 cut_3.html 的「导出标注」保存（自动分割后手动修正，再导出）:
+    {"image": "page1.jpg", "lines": [[top_y, bottom_y], ...], "splits": [[x, ...], ...], "skew": 0}
+image 为相对于标注文件所在文件夹的路径。每页只解码、二值化一次，各行的垂直投影在主进程中算好，
+分发给计算进程后只需对每组参数重新求分割点。
+
+预测的分割点与标注在 tolerance 像素以内一一配对即为命中；与前端一致，行首、行尾的分割点不计。
+
+示例:
+    python segment_sweep.py truth/*.json
+    python segment_sweep.py truth/*.json --zero-run 10 15 20 --valley-threshold 1000 2000 4000
+    python segment_sweep.py truth/*.json --save-profile camscanner
+    python segment_sweep.py --synthetic 4       # 用字图拼出的示例页面，标注为相邻两字墨迹之间的中点
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from auto_segment import (PROFILES_PATH, SPLIT_DEFAULTS, binarize, decode_gray_image, find_split_positions,
+                          shear_page, skew_slope)
+from segment_regression import compose_page
+
+# 默认扫描的参数网格；默认值（SPLIT_DEFAULTS）都在其中
+DEFAULT_GRID = {
+    'min_char_width': [20, 25, 30, 35, 40],
+    'max_char_width': [60, 70, 80, 90, 100],
+    'zero_run': [5, 10, 15, 20],
+    'savgol_window': [7, 11, 15],
+    'valley_threshold': [1000, 2000, 4000, 8000],
+}
+
+# 计算进程中的页面数据，由 _init_worker 设置
+_pages = None
+_tolerance = None
+
+def load_truth(path):
+    """
+    读取一份标注，解码并二值化其图片，返回 {name, projections, truth}。
+
+    projections 为各行带的垂直投影，truth 为各行去掉行首、行尾后排好序的分割点；
+    有倾斜角时先校正，与 /segment_page 带 skew 时一致。
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    image_path = os.path.join(os.path.dirname(os.path.abspath(path)), data['image'])
+    with open(image_path, 'rb') as f:
+        gray = decode_gray_image(f.read())
+    if gray is None:
+        raise ValueError(f'无法解码图片: {image_path}')
+    binary = shear_page(binarize(gray), skew_slope(data.get('skew', 0)))
+    height, width = binary.shape
+
+    projections, truth = [], []
+    for (top_y, bottom_y), splits in zip(data['lines'], data['splits']):
+        top_y = max(0, int(top_y))
+        bottom_y = max(top_y, min(height, int(bottom_y)))
+        if bottom_y == top_y:
+            continue
+        projections.append(np.sum(binary[top_y:bottom_y], axis=0))
+        truth.append(sorted(int(round(x)) for x in splits if 0 < x < width - 1))
+    return {'name': os.path.basename(path), 'projections': projections, 'truth': truth}
+
+def synthetic_truth(glyph_dir, count, width=1600):
+    """用字图拼出 count 张示例页面，以相邻两字墨迹之间的中点（及每行首字左缘、末字右缘）为标注。"""
+    pages = []
+    for seed in range(count):
+        placements = []
+        page, bands = compose_page(glyph_dir, seed, width, placements=placements)
+        binary = binarize(page)
+        projections, truth = [], []
+        for (top_y, bottom_y), ink in zip(bands, placements):
+            projections.append(np.sum(binary[top_y:bottom_y], axis=0))
+            if not ink:
+                truth.append([])
+                continue
+            points = [ink[0][0]] + [(right + left) // 2 for (_, right), (left, _) in zip(ink, ink[1:])] + [ink[-1][1]]
+            truth.append(sorted(x for x in points if 0 < x < width - 1))
+        pages.append({'name': f'synthetic-{seed}', 'projections': projections, 'truth': truth})
+    return pages
+
+def match_count(predicted, truth, tolerance):
+    """两个有序列表中距离不超过 tolerance 的点一一配对，返回配对数。"""
+    i = j = matched = 0
+    while i < len(predicted) and j < len(truth):
+        if abs(predicted[i] - truth[j]) <= tolerance:
+            matched += 1
+            i += 1
+            j += 1
+        elif predicted[i] < truth[j]:
+            i += 1
+        else:
+            j += 1
+    return matched
+
+def evaluate(pages, params, tolerance):
+    """
+    用一组参数分割所有页面的所有行。
+
+    返回:
+    dict: params、tp / fp / fn、precision / recall / f1、seconds（分割耗时）、pages（逐页 F1）
+    """
+    tp = fp = fn = 0
+    page_f1 = {}
+    seconds = 0.0
+    for page in pages:
+        page_tp = page_predicted = page_truth = 0
+        for projection, truth in zip(page['projections'], page['truth']):
+            start = time.perf_counter()
+            _, relative_splits = find_split_positions(projection, **params)
+            seconds += time.perf_counter() - start
+            predicted = [x for x in relative_splits if 0 < x < len(projection) - 1]
+            matched = match_count(predicted, truth, tolerance)
+            page_tp += matched
+            page_predicted += len(predicted)
+            page_truth += len(truth)
+        tp += page_tp
+        fp += page_predicted - page_tp
+        fn += page_truth - page_tp
+        page_f1[page['name']] = 2 * page_tp / (page_predicted + page_truth) if page_predicted + page_truth else 1.0
+
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    return {
+        'params': params,
+        'tp': tp,
+        'fp': fp,
+        'fn': fn,
+        'precision': precision,
+        'recall': recall,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        'seconds': seconds,
+        'pages': page_f1,
+    }
+
+def _init_worker(pages, tolerance):
+    global _pages, _tolerance
+    _pages, _tolerance = pages, tolerance
+
+def _evaluate_params(params):
+    return evaluate(_pages, params, _tolerance)
+
+def param_grid(grid):
+    """展开参数网格，跳过最小字符宽度不小于最大字符宽度、平滑窗口不是不小于 3 的奇数的组合。"""
+    keys = list(SPLIT_DEFAULTS)
+    combos = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        params = dict(zip(keys, values))
+        if params['min_char_width'] >= params['max_char_width']:
+            continue
+        if params['savgol_window'] < 3 or params['savgol_window'] % 2 == 0:
+            continue
+        combos.append(params)
+    return combos
+
+def sweep(pages, combos, tolerance, workers=None):
+    """在进程池中评估所有参数组合，按 F1 降序、耗时升序排列。"""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = [evaluate(pages, params, tolerance) for params in combos]
+    else:
+        # 页面投影只在进程启动时传一次，之后每个任务只传参数
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(pages, tolerance)) as executor:
+            results = list(executor.map(_evaluate_params, combos, chunksize=max(1, len(combos) // (workers * 8))))
+    results.sort(key=lambda result: (-result['f1'], result['seconds']))
+    return results
+
+def save_profile(path, name, result, tolerance, page_count, line_count):
+    """把一组参数连同评估结果写入扫描仪配置文件（与已有配置合并）。"""
+    profiles = {'profiles': {}}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            profiles = json.load(f)
+    profile = dict(result['params'])
+    profile['score'] = {
+        'precision': result['precision'],
+        'recall': result['recall'],
+        'f1': result['f1'],
+        'tolerance': tolerance,
+        'pages': page_count,
+        'lines': line_count,
+        'date': time.strftime('%Y-%m-%d'),
+    }
+    profiles.setdefault('profiles', {})[name] = profile
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, ensure_ascii=False, indent=1)
+    os.replace(path + '.tmp', path)
+
+def format_result(rank, result):
+    params = result['params']
+    return (f"{rank:>4} {params['min_char_width']:>4} {params['max_char_width']:>4} {params['zero_run']:>4} "
+            f"{params['savgol_window']:>4} {params['valley_threshold']:>6}  {result['precision']:>7.2%} "
+            f"{result['recall']:>7.2%} {result['f1']:>7.2%} {result['seconds'] * 1000:>9.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='分割参数扫描与准确率评估')
+    parser.add_argument('truth', nargs='*', help='cut_3.html 导出的标注文件')
+    parser.add_argument('--synthetic', type=int, default=0, help='另外用字图拼出 N 张示例页面作为标注')
+    parser.add_argument('-g', '--glyphs', default='handwriting_chars', help='拼页用的字图文件夹 (默认: handwriting_chars)')
+    parser.add_argument('-t', '--tolerance', type=int, default=8, help='分割点与标注的最大距离(像素) (默认: 8)')
+    for key, values in DEFAULT_GRID.items():
+        parser.add_argument('--' + key.replace('_', '-'), type=int, nargs='+', default=values,
+                            help=f"扫描的取值 (默认: {' '.join(map(str, values))})")
+    parser.add_argument('-w', '--workers', type=int, default=None, help='进程数 (默认: CPU 核数)')
+    parser.add_argument('-n', '--top', type=int, default=15, help='列出的组合数 (默认: 15)')
+    parser.add_argument('--json', help='把所有组合的评估结果写入 JSON 文件')
+    parser.add_argument('--save-profile', metavar='NAME', help='把排名第一的组合保存为扫描仪配置 NAME')
+    parser.add_argument('--profiles', default=PROFILES_PATH, help=f'扫描仪配置文件 (默认: {PROFILES_PATH})')
+    args = parser.parse_args()
+
+    pages = [load_truth(path) for path in args.truth]
+    if args.synthetic:
+        pages += synthetic_truth(args.glyphs, args.synthetic)
+    if not pages:
+        parser.error('需要提供标注文件或 --synthetic')
+    line_count = sum(len(page['projections']) for page in pages)
+    split_count = sum(len(truth) for page in pages for truth in page['truth'])
+
+    grid = {key: getattr(args, key) for key in DEFAULT_GRID}
+    combos = param_grid(grid)
+    print(f"标注: {len(pages)} 页，{line_count} 行，{split_count} 个分割点；参数组合 {len(combos)} 组")
+
+    start = time.perf_counter()
+    results = sweep(pages, combos, args.tolerance, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"用时 {elapsed:.1f} s\n")
+
+    print(f"{'排名':>4} {'最小':>4} {'最大':>4} {'零区':>4} {'窗口':>4} {'谷阈值':>6}  {'准确率':>7} {'召回率':>7} "
+          f"{'F1':>7} {'耗时(ms)':>9}")
+    for rank, result in enumerate(results[:args.top], start=1):
+        print(format_result(rank, result))
+    default = evaluate(pages, dict(SPLIT_DEFAULTS), args.tolerance)
+    print(format_result(0, default) + '  ← 当前默认')
+
+    worst = sorted(results[0]['pages'].items(), key=lambda item: item[1])[:5]
+    if len(pages) > 1:
+        print('\n排名第一的组合 F1 最低的页面: ' + '，'.join(f'{name} {f1:.1%}' for name, f1 in worst))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'tolerance': args.tolerance, 'pages': [page['name'] for page in pages],
+                       'default': default, 'results': results}, f, ensure_ascii=False, indent=1)
+    if args.save_profile:
+        save_profile(args.profiles, args.save_profile, results[0], args.tolerance, len(pages), line_count)
+        print(f"\n已把排名第一的组合保存为 {args.profiles} 中的 {args.save_profile}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+// 用 index.html 中的排版函数排版一段文本，输出 JSON，供 test_layout_parity.py 与 render.py 的结果比对。
+// 只取出排版和字图度量相关的函数，在 vm 中运行，不需要浏览器环境。
+//
+// 用法: node tests/layout_parity.js <index.html> <configs.js> <manifest.json | atlas/index.json> <文本文件> <预设名>
+// 输出: {"pages": [{"name": 预设名, "placements": [[字, 变体, x, y, 宽, 高, 绘制区域 | null], ...]}, ...],
+//        "missing": {"字": 次数}}
+// 绘制区域为 glyphRect() 的 [x, y, 宽, 高]，空白字图（glyphBlank）为 null。
+const fs = require('fs');
+const vm = require('vm');
+
+const LAYOUT_FUNCTIONS = [
+    'isChinese', 'isWestern', 'isPunctuation', 'tokenizeText', 'parseLine', 'lineView', 'layoutText', 'layoutPage',
+    'glyphEntries', 'glyphMetrics', 'glyphTrim', 'glyphBlank', 'glyphRect', 'nextVariant', 'recordMissing',
+];
+
+// 从脚本中按名字取出函数定义（花括号配对）
+function extractFunction(source, name) {
+    const start = source.search(new RegExp(`function ${name}\\(`));
+    if (start < 0) throw new Error(`index.html 中没有函数 ${name}`);
+    let depth = 0;
+    for (let i = source.indexOf('{', start); i < source.length; i++) {
+        if (source[i] === '{') depth++;
+        else if (source[i] === '}' && --depth === 0) return source.slice(start, i + 1);
+    }
+    throw new Error(`函数 ${name} 的花括号不配对`);
+}
+
+function extractConst(source, name) {
+    const match = source.match(new RegExp(`^\\s*const ${name} = .*;$`, 'm'));
+    if (!match) throw new Error(`index.html 中没有常量 ${name}`);
+    return match[0].trim();
+}
+
+const [htmlPath, configsPath, libraryPath, textPath, preset] = process.argv.slice(2);
+const html = fs.readFileSync(htmlPath, 'utf8');
+const library = JSON.parse(fs.readFileSync(libraryPath, 'utf8'));
+const isAtlas = 'atlases' in library;
+
+const script = [
+    fs.readFileSync(configsPath, 'utf8'),
+    extractConst(html, 'MARGIN_MARK'),
+    'let tokenCache = null;',
+    `let atlasIndex = ${isAtlas ? 'library' : 'null'};`,
+    `let glyphManifest = ${isAtlas ? 'null' : 'library'};`,
+    'const loadedSizes = new Map();',
+    'const variantCounters = new Map();',
+    'let missing_count = 0;',
+    'let missing_chars = new Map();',
+    ...LAYOUT_FUNCTIONS.map(name => extractFunction(html, name)),
+    `
+    const plan = layoutText(tokenizeText(text), config_dict[preset]);
+    JSON.stringify({
+        pages: plan.map(page => ({
+            name: page.config.name,
+            placements: page.placements.map(p => {
+                const rect = glyphRect(p);
+                return [p.char, p.variant, p.x, p.y, p.width, p.height,
+                        glyphBlank(p.char, p.variant) ? null : [rect.x, rect.y, rect.width, rect.height]];
+            }),
+        })),
+        missing: Object.fromEntries(missing_chars),
+    });
+    `,
+].join('\n');
+
+const context = vm.createContext({ library, text: fs.readFileSync(textPath, 'utf8'), preset });
+process.stdout.write(vm.runInContext(script, context));
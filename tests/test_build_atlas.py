@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""pack_shelves 的图集尺寸不超过 max_size，矩形互不重叠且都在图集内。"""
+import random
+
+import pytest
+
+from build_atlas import pack_shelves
+
+def check_packing(sizes, max_size, padding):
+    placements, extents = pack_shelves(sizes, max_size, padding)
+    for width, height in extents:
+        assert width <= max_size and height <= max_size
+    rects = {}
+    for (w, h), (atlas, x, y) in zip(sizes, placements):
+        width, height = extents[atlas]
+        assert x >= padding and y >= padding and x + w <= width and y + h <= height
+        rects.setdefault(atlas, []).append((x, y, x + w, y + h))
+    for atlas_rects in rects.values():
+        for i, (left, top, right, bottom) in enumerate(atlas_rects):
+            for other in atlas_rects[i + 1:]:
+                assert right + padding <= other[0] or other[2] + padding <= left or \
+                    bottom + padding <= other[1] or other[3] + padding <= top
+    return placements, extents
+
+@pytest.mark.parametrize('padding', [0, 1, 2])
+def test_pack_to_exactly_max_size(padding):
+    # 2 × 2 个矩形正好铺满 max_size × max_size
+    side = (20 - 2 * padding) // 2
+    max_size = 2 * (side + padding)
+    placements, extents = check_packing([(side, side)] * 4, max_size, padding)
+    assert extents == [(max_size, max_size)]
+    assert {atlas for atlas, _, _ in placements} == {0}
+
+def test_single_glyph_of_max_size():
+    _, extents = check_packing([(9, 9)], 10, 1)
+    assert extents == [(10, 10)]
+    with pytest.raises(ValueError):
+        pack_shelves([(10, 10)], 10, 1)
+
+def test_random_sizes_stay_within_max_size():
+    rng = random.Random(0)
+    sizes = [(rng.randint(5, 60), rng.randint(40, 120)) for _ in range(500)]
+    _, extents = check_packing(sizes, 256, 2)
+    assert len(extents) > 1
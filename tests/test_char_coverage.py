@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""count_chars 按排版时的方式计数：去掉 <[N]> 标记，—— 计为 ¨，与分块位置无关。"""
+from collections import Counter
+
+import pytest
+
+import char_coverage
+from char_coverage import count_chars
+
+TEXT = '第一段<[+4]>缩进——破折号\n<[-12]>左移一点<[3]>\t单独的 <[ 与 —— 都照常计数 a<b>[c]—\n末尾<'
+
+def expected_counts():
+    text = TEXT.replace('——', '¨')
+    for mark in ('<[+4]>', '<[-12]>', '<[3]>'):
+        text = text.replace(mark, '')
+    counts = Counter(text)
+    for char in char_coverage.SKIP_CHARS:
+        counts.pop(char, None)
+    return counts
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 11, 1 << 20])
+def test_markers_and_dashes_across_chunks(tmp_path, monkeypatch, chunk_size):
+    path = tmp_path / 'text.txt'
+    path.write_text(TEXT, encoding='utf-8')
+    monkeypatch.setattr(char_coverage, 'CHUNK_SIZE', chunk_size)
+    counts = count_chars([str(path)])
+    assert counts == expected_counts()
+    assert counts['¨'] == 2 and counts['—'] == 1
+    assert counts['['] == 2 and counts['<'] == 3 and '+' not in counts
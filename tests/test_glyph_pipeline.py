@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""glyph_pipeline.py 与 center.py → noise_ds.py 旧流程的输出应逐字节一致。"""
+import os
+import shutil
+
+import pytest
+
+from center import process_images
+from glyph_pipeline import run_pipeline
+from noise_ds import batch_denoise
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 中文字、居中时只做去噪的非中文字、大写字母和变体
+SAMPLES = ['永.png', '和.png', '九.png', '!.png', '%.png', '+cA.png', '+cA-1.png', '"-2.png']
+
+@pytest.fixture
+def sample_dir(tmp_path):
+    folder = tmp_path / 'handwriting_chars'
+    folder.mkdir()
+    for filename in SAMPLES:
+        shutil.copy2(os.path.join(ROOT, 'handwriting_chars', filename), folder / filename)
+    return str(folder)
+
+def _png_files(folder):
+    return sorted(f for f in os.listdir(folder) if f.lower().endswith('.png'))
+
+def test_fused_pipeline_matches_legacy(sample_dir, tmp_path):
+    centered_dir = str(tmp_path / 'output_chars')
+    legacy_dir = str(tmp_path / 'output_chars_ds')
+    fused_dir = str(tmp_path / 'fused')
+
+    process_images(sample_dir, centered_dir, 180, workers=1, force=True)
+    batch_denoise(centered_dir, legacy_dir, 180, 0.9)
+    run_pipeline(sample_dir, fused_dir, 180, 0.9, 180, workers=1)
+
+    assert _png_files(legacy_dir) == sorted(SAMPLES)
+    assert _png_files(fused_dir) == sorted(SAMPLES)
+    for filename in SAMPLES:
+        with open(os.path.join(legacy_dir, filename), 'rb') as f:
+            expected = f.read()
+        with open(os.path.join(fused_dir, filename), 'rb') as f:
+            actual = f.read()
+        assert actual == expected, filename
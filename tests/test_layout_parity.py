@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+render.py 的排版与 index.html 逐字一致：同一段文本、同一预设下，每页的预设、每个字的变体和位置，
+以及精简字库中按裁剪框换算的绘制区域（GlyphSet.place 与 glyphRect）都应完全相同。
+网页版的排版函数由 layout_parity.js 在 node 中运行；没有 node 时跳过。
+"""
+import json
+import os
+import random
+import shutil
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+import render
+from build_atlas import build_atlas
+from export_glyphs import export_library
+from glyphs import build_manifest, load_manifest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NODE = shutil.which('node')
+PRESETS = render.load_presets(os.path.join(ROOT, 'configs.js'))
+
+pytestmark = pytest.mark.skipif(NODE is None, reason='需要 node 运行 index.html 的排版函数')
+
+# 字库中没有的字，以及整张空白的字图
+MISSING = '龘齉𠀋'
+BLANK = '〇'
+# 标点、西文、空格、制表符、—— 和左边距标记，覆盖换行时的标点悬挂、中西文间距和边距切换
+EXTRAS = ['，', '。', '！', '？', '“', '”', '《', '》', '…', '、', '；', '(', ')', 'a', 'Z', '9', 'x', 'Q',
+          ' ', ' ', '\t', '——', '<[-3]>', '<[+25]>', '<[12]>', '<[+5]>']
+
+def sample_text(chars, seed, length):
+    """用固定种子生成的随机文本，混有缺字、空白字、标点、西文、边距标记和 \\n、\\r\\n 换行。"""
+    rng = random.Random(seed)
+    pool = list(chars) * 6 + list(MISSING) + [BLANK] * 2 + EXTRAS * 3
+    parts = []
+    for _ in range(length):
+        roll = rng.random()
+        if roll < 0.02:
+            parts.append('\n')
+        elif roll < 0.025:
+            parts.append('\r\n')
+        else:
+            parts.append(rng.choice(pool))
+    return ''.join(parts)
+
+@pytest.fixture(scope='module')
+def libraries(tmp_path_factory):
+    """
+    从 output_chars_ds 中取一部分字图（含变体）组成小字库，加一张空白字图，
+    分别生成原字库、图集、精简字库和由精简字库打包的图集。
+
+    返回:
+    dict: 名称 -> (render.py 使用的字库文件夹, index.html 读取的清单或图集索引)
+    """
+    tmp = tmp_path_factory.mktemp('layout_parity')
+    source = os.path.join(ROOT, 'output_chars_ds')
+    chars = sorted(load_manifest(source)['glyphs'].items())
+    rng = random.Random(0)
+    library = str(tmp / 'library')
+    os.makedirs(library)
+    for _, entries in rng.sample(chars, 300):
+        for entry in entries:
+            shutil.copy2(os.path.join(source, entry[0]), library)
+    cv2.imwrite(os.path.join(library, BLANK + '.png'), np.full((90, 40), 255, np.uint8))
+    build_manifest(library)
+
+    published = str(tmp / 'published')
+    export_library(library, published, workers=1)
+    build_atlas(library, str(tmp / 'atlas'))
+    build_atlas(published, str(tmp / 'published_atlas'))
+    return {
+        'manifest': (library, os.path.join(library, 'manifest.json')),
+        'atlas': (library, str(tmp / 'atlas' / 'index.json')),
+        'published': (published, os.path.join(published, 'manifest.json')),
+        'published_atlas': (published, str(tmp / 'published_atlas' / 'index.json')),
+    }
+
+def js_layout(library_index, text_path, preset):
+    result = subprocess.run([NODE, os.path.join(ROOT, 'tests', 'layout_parity.js'), os.path.join(ROOT, 'index.html'),
+                             os.path.join(ROOT, 'configs.js'), library_index, text_path, preset],
+                            capture_output=True, text=True, encoding='utf-8', check=True)
+    return json.loads(result.stdout)
+
+def py_layout(text, preset, glyphs):
+    pages = []
+    missing = {}
+    for page in render.layout_pages(text, PRESETS[preset], PRESETS, glyphs):
+        placements = []
+        for char, variant, x, y, w, h in page.glyphs:
+            rect = glyphs.place(char, variant, x, y, w, h)
+            placements.append([char, variant, x, y, w, h, None if rect is None else list(rect)])
+        pages.append({'name': page.config['name'], 'placements': placements})
+        for char in page.missing:
+            missing[char] = missing.get(char, 0) + 1
+    return {'pages': pages, 'missing': missing}
+
+@pytest.mark.parametrize('library', ['manifest', 'atlas', 'published', 'published_atlas'])
+@pytest.mark.parametrize('preset', sorted(PRESETS))
+def test_layout_matches_index_html(libraries, library, preset, tmp_path):
+    folder, library_index = libraries[library]
+    glyphs = render.GlyphSet(folder)
+    chars = [char for char in load_manifest(folder)['glyphs'] if char != BLANK]
+    for seed, length in [(1, 600), (2, 4000)]:
+        text = sample_text(chars, seed, length)
+        text_path = tmp_path / f'text-{seed}.txt'
+        text_path.write_bytes(text.encode('utf-8'))
+
+        expected = js_layout(library_index, str(text_path), preset)
+        actual = py_layout(text, preset, glyphs)
+        assert [page['name'] for page in actual['pages']] == [page['name'] for page in expected['pages']]
+        for number, (page, expected_page) in enumerate(zip(actual['pages'], expected['pages'])):
+            assert page['placements'] == expected_page['placements'], f'种子 {seed} 第 {number + 1} 页'
+        assert actual['missing'] == expected['missing']
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""PdfWriter 出错时不留下写了一半的 PDF，异常照常抛出。"""
+import pytest
+from PIL import Image
+
+from render import PdfWriter
+
+def test_exception_removes_partial_file(tmp_path):
+    path = tmp_path / 'out.pdf'
+    with pytest.raises(RuntimeError):
+        with PdfWriter(str(path)) as pdf:
+            pdf.add_image(Image.new('L', (4, 4), 255))
+            raise RuntimeError('排版出错')
+    assert not path.exists()
+
+def test_failed_close_removes_partial_file(tmp_path):
+    path = tmp_path / 'out.pdf'
+    with pytest.raises(KeyError):
+        with PdfWriter(str(path)) as pdf:
+            # 预留了编号却没有写入的对象，写交叉引用表时出错
+            pdf._reserve()
+    assert not path.exists()
+
+def test_complete_file(tmp_path):
+    path = tmp_path / 'out.pdf'
+    with PdfWriter(str(path)) as pdf:
+        pdf.add_page(100, 100, b'', {})
+    assert path.read_bytes().endswith(b'%%EOF\n')